@@ -0,0 +1,65 @@
+"""Measure how long `import main` takes and which heavy modules it drags in.
+
+Run from backend/:
+    python bench/import_time.py [--runs 5]
+
+Each run uses a fresh interpreter so nothing is cached between samples.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Modules that should only load once a marking request (or warm-up) needs them.
+HEAVY_MODULES = ["pdf2image", "PIL.Image", "PIL.ImageFont", "numpy", "cv2"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main  # noqa: F401
+elapsed = time.perf_counter() - start
+heavy = {heavy!r}
+print(json.dumps({{
+    "seconds": elapsed,
+    "loaded": [name for name in heavy if name in sys.modules],
+}}))
+"""
+
+
+def run_once() -> dict:
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE.format(heavy=HEAVY_MODULES)],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    samples = [run_once() for _ in range(args.runs)]
+    times_ms = [sample["seconds"] * 1000 for sample in samples]
+    loaded = sorted({name for sample in samples for name in sample["loaded"]})
+
+    print(f"import main: median {statistics.median(times_ms):.1f} ms, "
+          f"min {min(times_ms):.1f} ms over {args.runs} runs")
+    if loaded:
+        print(f"heavy modules loaded at import: {', '.join(loaded)}")
+        return 1
+
+    print("heavy modules loaded at import: none")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,436 @@
+"""Load generator for the marking API.
+
+Each simulated staff member logs in through /auth/login, loads answer keys
+and a concept map through the /config routes, then repeatedly uploads
+synthetic answer sheets to /mark/single-student and/or /mark/batch.
+
+Sessions live in each server process's memory, so every simulated user
+stays on one server. To spread load over several processes, run one
+single-worker uvicorn per port rather than ``uvicorn --workers N``.
+
+Run from backend/ against servers you started yourself:
+    ASET_APP_PASSWORD=secret uvicorn main:app --port 8000
+    ASET_APP_PASSWORD=secret uvicorn main:app --port 8001
+    python bench/load_test.py --password secret --base-url http://127.0.0.1:8000 \
+        --base-url http://127.0.0.1:8001 --concurrency 8 --requests 200
+
+or let the script start (and stop) one local uvicorn per server worker:
+    python bench/load_test.py --start-server --server-workers 4 --scenario mixed
+
+Results are written to bench/results/<timestamp>-<scenario>.json; pass
+--compare <older result file> to print the change against an earlier run.
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.message import Message
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+LETTERS = "ABCDE"
+READING_QUESTIONS = 35
+QR_AR_QUESTIONS = 30
+
+
+# --- synthetic inputs -------------------------------------------------------
+
+
+def synthetic_sheet_pdf(seed: int) -> bytes:
+    """One A4 page that rasterizes to full 300 DPI size, with some dark marks."""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    page = Image.new("L", (595, 842), 255)
+    draw = ImageDraw.Draw(page)
+    for _ in range(60):
+        x, y = rng.randrange(40, 540), rng.randrange(80, 800)
+        draw.ellipse((x, y, x + 8, y + 8), fill=rng.randrange(0, 120))
+
+    buffer = BytesIO()
+    page.save(buffer, format="PDF", resolution=72)
+    return buffer.getvalue()
+
+
+def synthetic_keys(seed: int = 0) -> Dict[str, Any]:
+    rng = random.Random(seed)
+
+    def key(count: int) -> Dict[str, str]:
+        return {str(q): rng.choice(LETTERS) for q in range(1, count + 1)}
+
+    return {
+        "reading": key(READING_QUESTIONS),
+        "qr_ar": {"qr": key(QR_AR_QUESTIONS), "ar": key(QR_AR_QUESTIONS)},
+        "concepts": {
+            "Reading": {"Inference": list(range(1, 18)), "Vocabulary": list(range(18, 36))},
+            "QR": {"Number": list(range(1, 16)), "Geometry": list(range(16, 31))},
+            "AR": {"Patterns": list(range(1, 31))},
+        },
+    }
+
+
+def synthetic_batch(students: int, sheet_pdf: bytes) -> Tuple[bytes, str]:
+    """ZIP of per-student PDFs plus the matching manifest JSON."""
+    buffer = BytesIO()
+    manifest = []
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        for i in range(students):
+            reading_name = f"student{i}_reading.pdf"
+            qr_ar_name = f"student{i}_qr_ar.pdf"
+            zf.writestr(reading_name, sheet_pdf)
+            zf.writestr(qr_ar_name, sheet_pdf)
+            manifest.append(
+                {
+                    "student_name": f"Load Student {i}",
+                    "writing_score": "7",
+                    "reading_pdf": reading_name,
+                    "qr_ar_pdf": qr_ar_name,
+                }
+            )
+    return buffer.getvalue(), json.dumps(manifest)
+
+
+# --- HTTP -------------------------------------------------------------------
+
+
+def encode_multipart(
+    fields: Dict[str, str],
+    files: Dict[str, Tuple[str, bytes, str]],
+) -> Tuple[bytes, str]:
+    boundary = uuid4().hex
+    parts: List[bytes] = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+            f"{value}\r\n".encode("utf-8")
+        )
+    for name, (filename, data, content_type) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+            f'filename="{filename}"\r\nContent-Type: {content_type}\r\n\r\n'.encode("utf-8")
+            + data
+            + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode("utf-8"))
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def request(
+    base_url: str,
+    method: str,
+    path: str,
+    body: Optional[bytes] = None,
+    content_type: Optional[str] = None,
+    session_id: Optional[str] = None,
+    timeout: float = 600,
+) -> Tuple[int, bytes, Message]:
+    headers = {}
+    if content_type:
+        headers["Content-Type"] = content_type
+    if session_id:
+        headers["X-Session-ID"] = session_id
+
+    req = urllib.request.Request(base_url + path, data=body, method=method, headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, resp.read(), resp.headers
+    except urllib.error.HTTPError as exc:
+        return exc.code, exc.read(), exc.headers
+
+
+class SetupFailed(RuntimeError):
+    """A login or config call failed; carries the path and HTTP status (0 if none)."""
+
+    def __init__(self, path: str, status: int, detail: str):
+        super().__init__(f"{path} returned {status}: {detail}")
+        self.path = path
+        self.status = status
+
+
+def post_json(base_url: str, path: str, payload: Any, session_id: Optional[str] = None) -> Any:
+    try:
+        status, body, _ = request(
+            base_url, "POST", path, json.dumps(payload).encode("utf-8"), "application/json",
+            session_id,
+        )
+    except OSError as exc:  # connection refused / reset, timeout
+        raise SetupFailed(path, 0, str(exc)) from exc
+    if status != 200:
+        raise SetupFailed(path, status, repr(body[:200]))
+    return json.loads(body)
+
+
+def open_session(base_url: str, password: str, keys: Dict[str, Any]) -> str:
+    """Log in and load keys the way a staff member would before marking."""
+    session_id = post_json(base_url, "/auth/login", {"password": password})["session_id"]
+    post_json(base_url, "/config/reading-key", keys["reading"], session_id)
+    post_json(base_url, "/config/qr-ar-key", keys["qr_ar"], session_id)
+    post_json(base_url, "/config/concepts", keys["concepts"], session_id)
+    return session_id
+
+
+# --- load -------------------------------------------------------------------
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples: List[Dict[str, Any]] = []
+
+    def add(
+        self,
+        endpoint: str,
+        status: int,
+        seconds: float,
+        size: int,
+        failed_students: int = 0,
+    ) -> None:
+        with self.lock:
+            self.samples.append(
+                {
+                    "endpoint": endpoint,
+                    "status": status,
+                    "seconds": seconds,
+                    "bytes": size,
+                    "failed_students": failed_students,
+                }
+            )
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(values)))
+    return values[rank - 1]
+
+
+def summarize(samples: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+    latencies = sorted(sample["seconds"] for sample in samples)
+    errors = sum(1 for sample in samples if sample["status"] != 200)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        # Batches still return 200 when individual students fail to mark.
+        "failed_students": sum(sample["failed_students"] for sample in samples),
+        "throughput_rps": round(len(samples) / wall_seconds, 3) if wall_seconds else 0.0,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 1) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+    }
+
+
+def run_load(args: argparse.Namespace, base_urls: List[str]) -> Dict[str, Any]:
+    keys = synthetic_keys()
+    sheet_pdf = Path(args.sheet_pdf).read_bytes() if args.sheet_pdf else synthetic_sheet_pdf(1)
+    batch_zip, batch_manifest = synthetic_batch(args.batch_size, sheet_pdf)
+
+    single_body, single_type = encode_multipart(
+        {"student_name": "Load Student", "writing_score": "7"},
+        {
+            "reading_pdf": ("reading.pdf", sheet_pdf, "application/pdf"),
+            "qr_ar_pdf": ("qr_ar.pdf", sheet_pdf, "application/pdf"),
+        },
+    )
+    batch_body, batch_type = encode_multipart(
+        {"manifest": batch_manifest},
+        {"files_zip": ("batch.zip", batch_zip, "application/zip")},
+    )
+    scenarios = {
+        "single": [("/mark/single-student", single_body, single_type)],
+        "batch": [("/mark/batch", batch_body, batch_type)],
+        "mixed": [
+            ("/mark/single-student", single_body, single_type),
+            ("/mark/batch", batch_body, batch_type),
+        ],
+    }[args.scenario]
+
+    recorder = Recorder()
+    counter = iter(range(args.requests))
+    counter_lock = threading.Lock()
+
+    def user(user_index: int) -> None:
+        # Sessions are per server process: keep each user on one server.
+        base_url = base_urls[user_index % len(base_urls)]
+        started = time.perf_counter()
+        try:
+            session_id = open_session(base_url, args.password, keys)
+        except SetupFailed as exc:
+            recorder.add(exc.path, exc.status, time.perf_counter() - started, 0)
+            sys.stderr.write(f"user {user_index}: {exc}\n")
+            return
+
+        while True:
+            with counter_lock:
+                n = next(counter, None)
+            if n is None:
+                return
+            path, body, content_type = scenarios[n % len(scenarios)]
+            started = time.perf_counter()
+            try:
+                status, payload, headers = request(
+                    base_url, "POST", path, body, content_type, session_id, args.timeout
+                )
+                size = len(payload)
+                failed_students = int(headers.get("X-Batch-Failed", 0))
+            except Exception:  # connection reset, timeout, ...
+                status, size, failed_students = 0, 0, 0
+            recorder.add(path, status, time.perf_counter() - started, size, failed_students)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for future in [pool.submit(user, i) for i in range(args.concurrency)]:
+            future.result()
+    wall_seconds = time.perf_counter() - started
+
+    endpoints = sorted({sample["endpoint"] for sample in recorder.samples})
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "scenario": args.scenario,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "batch_size": args.batch_size,
+            "server_workers": args.server_workers if args.start_server else None,
+            "base_urls": base_urls,
+        },
+        "wall_seconds": round(wall_seconds, 3),
+        "overall": summarize(recorder.samples, wall_seconds),
+        "endpoints": {
+            endpoint: summarize(
+                [s for s in recorder.samples if s["endpoint"] == endpoint], wall_seconds
+            )
+            for endpoint in endpoints
+        },
+    }
+
+
+# --- server / reporting -----------------------------------------------------
+
+
+def start_server(port: int, password: str) -> subprocess.Popen:
+    """One single-process uvicorn; sessions would not survive --workers > 1."""
+    env = dict(os.environ, ASET_APP_PASSWORD=password)
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--log-level", "warning",
+        ],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("uvicorn exited during startup")
+        try:
+            if request(base_url, "GET", "/health", timeout=2)[0] == 200:
+                return process
+        except OSError:
+            pass
+        time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError("uvicorn did not answer /health within 60s")
+
+
+def print_report(result: Dict[str, Any], previous: Optional[Dict[str, Any]]) -> None:
+    columns = [
+        "requests", "error_rate", "failed_students", "throughput_rps", "p50_ms", "p95_ms", "p99_ms",
+    ]
+    rows = [("overall", result["overall"])] + list(result["endpoints"].items())
+
+    print(f"{'':24}" + "".join(f"{c:>16}" for c in columns))
+    for name, stats in rows:
+        print(f"{name:24}" + "".join(f"{stats[c]:>16}" for c in columns))
+        if previous is None:
+            continue
+        old = previous["overall"] if name == "overall" else previous["endpoints"].get(name)
+        if old:
+            deltas = [
+                "-" if c not in old
+                else f"{stats[c] - old[c]:+.3f}" if isinstance(stats[c], float)
+                else f"{stats[c] - old[c]:+d}"
+                for c in columns
+            ]
+            print(f"{'  vs previous':24}" + "".join(f"{d:>16}" for d in deltas))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Marking API load test")
+    parser.add_argument(
+        "--base-url",
+        action="append",
+        help="Server to test; repeat for several single-worker servers (default :8000)",
+    )
+    parser.add_argument("--password", default=os.getenv("ASET_APP_PASSWORD", "loadtest"))
+    parser.add_argument("--scenario", choices=["single", "batch", "mixed"], default="single")
+    parser.add_argument("--concurrency", type=int, default=4, help="Simulated staff members")
+    parser.add_argument("--requests", type=int, default=40, help="Total marking requests")
+    parser.add_argument("--batch-size", type=int, default=5, help="Students per batch ZIP")
+    parser.add_argument("--sheet-pdf", help="Use a real answer sheet PDF instead of a synthetic one")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--start-server", action="store_true", help="Run a local uvicorn for the test")
+    parser.add_argument("--port", type=int, default=8765, help="First port for --start-server")
+    parser.add_argument(
+        "--server-workers",
+        type=int,
+        default=1,
+        help="With --start-server, how many uvicorn processes to run on consecutive ports",
+    )
+    parser.add_argument("--output-dir", default=str(RESULTS_DIR))
+    parser.add_argument("--compare", help="Earlier result JSON to compare against")
+    args = parser.parse_args()
+
+    servers: List[subprocess.Popen] = []
+    base_urls = args.base_url or ["http://127.0.0.1:8000"]
+
+    try:
+        if args.start_server:
+            base_urls = []
+            for port in range(args.port, args.port + args.server_workers):
+                servers.append(start_server(port, args.password))
+                base_urls.append(f"http://127.0.0.1:{port}")
+
+        result = run_load(args, base_urls)
+    finally:
+        for server in servers:
+            server.terminate()
+        for server in servers:
+            server.wait(timeout=30)
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_path = output_dir / f"{datetime.now():%Y%m%d-%H%M%S}-{args.scenario}.json"
+    output_path.write_text(json.dumps(result, indent=2))
+
+    previous = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print_report(result, previous)
+    print(f"\nSaved {output_path}")
+    overall = result["overall"]
+    return 1 if overall["errors"] or overall["failed_students"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,34 @@
-from typing import Dict, List, Tuple
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
 
-from PIL import Image, ImageDraw, ImageFont
+from .profiling import profile_stage
+from .questions_qr_ar import QUESTIONS_AR, QUESTIONS_QR
+from .questions_reading import QUESTIONS_READING
 
-# Fallback to default font if system font missing
-try:
-    FONT = ImageFont.truetype("arial.ttf", 22)
-except Exception:  # pragma: no cover - font availability varies by system
-    FONT = ImageFont.load_default()
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from PIL import Image, ImageFont
+
+
+@lru_cache(maxsize=1)
+def get_font() -> "ImageFont.ImageFont":
+    """Load the score font once, on first use."""
+    from PIL import ImageFont
+
+    # Fallback to default font if system font missing
+    try:
+        return ImageFont.truetype("arial.ttf", 22)
+    except Exception:  # pragma: no cover - font availability varies by system
+        return ImageFont.load_default()
 
 
 def annotate_incorrect_bubbles(
-    image: Image.Image,
+    image: "Image.Image",
     answers: Dict[str, str],
     results: Dict[str, bool],
     rois: List,
-) -> Image.Image:
+) -> "Image.Image":
     """Draw a red rectangle around bubbles that were answered incorrectly."""
+    from PIL import ImageDraw
 
     annotated = image.convert("RGB")
     draw = ImageDraw.Draw(annotated)
@@ -41,18 +54,63 @@ def annotate_incorrect_bubbles(
 
 
 def write_section_score(
-    image: Image.Image,
+    image: "Image.Image",
     label: str,
     correct: int,
     total: int,
     position: Tuple[int, int] = (50, 50),
-) -> Image.Image:
+) -> "Image.Image":
     """Write score summary onto page."""
+    from PIL import ImageDraw
 
     annotated = image.convert("RGB")
     draw = ImageDraw.Draw(annotated)
 
     text = f"{label}: {correct}/{total}"
-    draw.text(position, text, fill="black", font=FONT)
+    draw.text(position, text, fill="black", font=get_font())
 
     return annotated
+
+
+@profile_stage("annotate.sheets")
+def annotate_student_sheets(
+    reading_image: "Image.Image",
+    qr_ar_image: "Image.Image",
+    result: Dict[str, Any],
+) -> Tuple["Image.Image", "Image.Image"]:
+    """Annotate both sheets for one marked student; returns (reading, qr_ar)."""
+
+    reading_img_annot = annotate_incorrect_bubbles(
+        reading_image,
+        result["reading"]["answers"],
+        result["reading"]["results"],
+        QUESTIONS_READING,
+    )
+    reading_img_annot = write_section_score(
+        reading_img_annot,
+        "Reading",
+        result["reading"]["correct"],
+        result["reading"]["total"],
+    )
+
+    # Apply sequentially to cover both subjects on the shared sheet
+    qr_ar_img_annot = annotate_incorrect_bubbles(
+        qr_ar_image,
+        result["qr"]["answers"],
+        result["qr"]["results"],
+        QUESTIONS_QR,
+    )
+    qr_ar_img_annot = annotate_incorrect_bubbles(
+        qr_ar_img_annot,
+        result["ar"]["answers"],
+        result["ar"]["results"],
+        QUESTIONS_AR,
+    )
+    qr_ar_img_annot = write_section_score(
+        qr_ar_img_annot,
+        "QR/AR",
+        result["qr"]["correct"] + result["ar"]["correct"],
+        result["qr"]["total"] + result["ar"]["total"],
+    )
+
+    return reading_img_annot, qr_ar_img_annot
@@ -1,98 +1,318 @@
 import json
+import shutil
 import zipfile
 from io import BytesIO
-from typing import Any, Dict, List
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, BinaryIO, Dict, List, Optional, Tuple, Union
 
-from .annotate import annotate_incorrect_bubbles, write_section_score
-from .engine import mark_single_student_papers
+from .annotate import annotate_student_sheets
+from .engine import mark_student_images
 from .pdf_tools import image_to_pdf_bytes, pdf_to_images
-from .questions_qr_ar import QUESTIONS_AR, QUESTIONS_QR
-from .questions_reading import QUESTIONS_READING
+from .preview import PreviewStore, build_preview_entry
+from .profiling import profile_stage
+from .work_queue import WorkQueue
+
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from PIL import Image
+
+BATCH_ERROR_REPORT = "batch_errors.json"
+
+# Raw bytes, a path to an assembled chunked upload, or an open file object.
+ZipSource = Union[bytes, str, Path, BinaryIO]
+
+
+def open_input_zip(zip_source: ZipSource) -> zipfile.ZipFile:
+    """Open the uploaded batch archive without copying files into memory."""
+    if isinstance(zip_source, bytes):
+        zip_source = BytesIO(zip_source)
+    return zipfile.ZipFile(zip_source, "r")
+
+
+@profile_stage("batch.mark_student")
+def mark_student(
+    student_name: str,
+    writing_score: Any,
+    reading_bytes: bytes,
+    qr_ar_bytes: bytes,
+    answer_keys: Dict[str, Any],
+    concept_map: Dict[str, Any],
+) -> Tuple[Dict[str, Any], "Image.Image", "Image.Image"]:
+    """Render, mark and annotate one student; returns (payload, reading, qr_ar)."""
+    reading_images = pdf_to_images(reading_bytes)
+    qr_ar_images = pdf_to_images(qr_ar_bytes)
+    if not reading_images or not qr_ar_images:
+        raise ValueError(
+            "PDF conversion returned no pages; ensure PDFs contain at least one page."
+        )
+
+    result = mark_student_images(
+        reading_images[0],
+        qr_ar_images[0],
+        answer_keys,
+        concept_map,
+    )
+
+    reading_img_annot, qr_ar_img_annot = annotate_student_sheets(
+        reading_images[0],
+        qr_ar_images[0],
+        result,
+    )
+
+    payload = {
+        "student_name": student_name,
+        "writing_score": writing_score,
+        **result,
+    }
+    return payload, reading_img_annot, qr_ar_img_annot
+
+
+@profile_stage("batch.output_files")
+def student_output_files(
+    student_name: str,
+    reading_img_annot: "Image.Image",
+    qr_ar_img_annot: "Image.Image",
+    payload: Dict[str, Any],
+) -> Dict[str, bytes]:
+    """File name -> contents for one student's folder in the batch ZIP."""
+    return {
+        f"{student_name}_reading_annotated.pdf": image_to_pdf_bytes(reading_img_annot),
+        f"{student_name}_qr_ar_annotated.pdf": image_to_pdf_bytes(qr_ar_img_annot),
+        f"{student_name}_marking_data.json": json.dumps(payload, indent=2).encode("utf-8"),
+    }
+
+
+def read_manifest_entry(entry: Dict[str, Any]) -> Tuple[str, Any, str, str]:
+    """Validate a manifest entry; returns (student_name, writing_score, reading, qr_ar)."""
+    student_name = entry.get("student_name")
+    writing_score = entry.get("writing_score")
+    reading_name = entry.get("reading_pdf")
+    qr_ar_name = entry.get("qr_ar_pdf")
+
+    if not all([student_name, reading_name, qr_ar_name]):
+        raise ValueError("Manifest entries must include student_name, reading_pdf, qr_ar_pdf")
+
+    return student_name, writing_score, reading_name, qr_ar_name
+
+
+def record_failure(
+    failures: List[Dict[str, Any]],
+    entry: Dict[str, Any],
+    error: Any,
+) -> None:
+    """Note one student that could not be marked, for the error report and retry."""
+    if isinstance(error, BaseException):
+        error = f"{error.__class__.__name__}: {error}"
+    failures.append(
+        {
+            "student_name": entry.get("student_name") if isinstance(entry, dict) else None,
+            "manifest_entry": entry,
+            "error": error,
+        }
+    )
+
+
+def write_error_report(
+    out_zip: zipfile.ZipFile,
+    failures: List[Dict[str, Any]],
+    marked: int,
+) -> None:
+    """Add batch_errors.json to the output ZIP when any student failed."""
+    if not failures:
+        return
+    report = {
+        "marked": marked,
+        "failed": len(failures),
+        "failures": failures,
+    }
+    out_zip.writestr(BATCH_ERROR_REPORT, json.dumps(report, indent=2))
 
 
 def process_batch_zip(
-    zip_bytes: bytes,
+    zip_source: ZipSource,
     manifest: List[Dict[str, Any]],
     answer_keys: Dict[str, Any],
     concept_map: Dict[str, Any],
+    previews: Optional[PreviewStore] = None,
+    failures: Optional[List[Dict[str, Any]]] = None,
 ) -> BytesIO:
-    input_zip = zipfile.ZipFile(BytesIO(zip_bytes), "r")
+    """Mark every manifest entry; a student that fails is reported, not fatal."""
+    failures = [] if failures is None else failures
+    marked = 0
     out_buf = BytesIO()
 
-    with zipfile.ZipFile(out_buf, "w", zipfile.ZIP_DEFLATED) as out_zip:
+    with open_input_zip(zip_source) as input_zip, zipfile.ZipFile(
+        out_buf, "w", zipfile.ZIP_DEFLATED
+    ) as out_zip:
         for entry in manifest:
-            student_name = entry.get("student_name")
-            writing_score = entry.get("writing_score")
-            reading_name = entry.get("reading_pdf")
-            qr_ar_name = entry.get("qr_ar_pdf")
-
-            if not all([student_name, reading_name, qr_ar_name]):
-                raise ValueError("Manifest entries must include student_name, reading_pdf, qr_ar_pdf")
-
-            reading_bytes = input_zip.read(reading_name)
-            qr_ar_bytes = input_zip.read(qr_ar_name)
-
-            result = mark_single_student_papers(
-                reading_bytes,
-                qr_ar_bytes,
-                answer_keys,
-                concept_map,
-            )
-
-            reading_img = pdf_to_images(reading_bytes)[0]
-            qr_ar_img = pdf_to_images(qr_ar_bytes)[0]
+            try:
+                student_name, writing_score, reading_name, qr_ar_name = read_manifest_entry(entry)
 
-            reading_img_annot = annotate_incorrect_bubbles(
-                reading_img,
-                result["reading"]["answers"],
-                result["reading"]["results"],
-                QUESTIONS_READING,
-            )
-            reading_img_annot = write_section_score(
-                reading_img_annot,
-                "Reading",
-                result["reading"]["correct"],
-                result["reading"]["total"],
-            )
+                with profile_stage("batch.read_inputs"):
+                    reading_bytes = input_zip.read(reading_name)
+                    qr_ar_bytes = input_zip.read(qr_ar_name)
 
-            qr_ar_img_annot = annotate_incorrect_bubbles(
-                qr_ar_img,
-                result["qr"]["answers"],
-                result["qr"]["results"],
-                QUESTIONS_QR,
-            )
-            qr_ar_img_annot = annotate_incorrect_bubbles(
-                qr_ar_img_annot,
-                result["ar"]["answers"],
-                result["ar"]["results"],
-                QUESTIONS_AR,
-            )
-            qr_ar_img_annot = write_section_score(
-                qr_ar_img_annot,
-                "QR/AR",
-                result["qr"]["correct"] + result["ar"]["correct"],
-                result["qr"]["total"] + result["ar"]["total"],
-            )
+                payload, reading_img_annot, qr_ar_img_annot = mark_student(
+                    student_name,
+                    writing_score,
+                    reading_bytes,
+                    qr_ar_bytes,
+                    answer_keys,
+                    concept_map,
+                )
+                files = student_output_files(
+                    student_name, reading_img_annot, qr_ar_img_annot, payload
+                )
+                preview = (
+                    build_preview_entry(reading_img_annot, qr_ar_img_annot, payload)
+                    if previews is not None
+                    else None
+                )
+            except Exception as exc:
+                record_failure(failures, entry, exc)
+                continue
 
             base = f"{student_name}/"
+            for name, data in files.items():
+                out_zip.writestr(base + name, data)
+            marked += 1
 
-            out_zip.writestr(
-                base + f"{student_name}_reading_annotated.pdf",
-                image_to_pdf_bytes(reading_img_annot),
-            )
-            out_zip.writestr(
-                base + f"{student_name}_qr_ar_annotated.pdf",
-                image_to_pdf_bytes(qr_ar_img_annot),
-            )
-            payload = {
-                "student_name": student_name,
-                "writing_score": writing_score,
-                **result,
-            }
-            out_zip.writestr(
-                base + f"{student_name}_marking_data.json",
-                json.dumps(payload, indent=2),
+            if preview is not None:
+                previews.put(student_name, preview)
+
+        write_error_report(out_zip, failures, marked)
+
+    out_buf.seek(0)
+    return out_buf
+
+
+def enqueue_batch_zip(
+    queue: WorkQueue,
+    zip_source: ZipSource,
+    manifest: List[Dict[str, Any]],
+    answer_keys: Dict[str, Any],
+    concept_map: Dict[str, Any],
+    failures: Optional[List[Dict[str, Any]]] = None,
+) -> str:
+    """Split a batch into per-student tasks on the shared work queue; returns the job id.
+
+    Entries whose files cannot be read are recorded in ``failures`` and not queued.
+    """
+    failures = [] if failures is None else failures
+    job_id, input_dir = queue.create_job_dir()
+
+    try:
+        entries = _stage_job_inputs(zip_source, manifest, input_dir, failures)
+        return queue.enqueue_job(job_id, entries, answer_keys, concept_map)
+    except BaseException:
+        queue.delete_job(job_id)
+        raise
+
+
+def _stage_job_inputs(
+    zip_source: ZipSource,
+    manifest: List[Dict[str, Any]],
+    input_dir: Path,
+    failures: List[Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    entries = []
+
+    with open_input_zip(zip_source) as input_zip:
+        for position, entry in enumerate(manifest):
+            try:
+                student_name, writing_score, reading_name, qr_ar_name = read_manifest_entry(entry)
+                # Stream each PDF straight to the shared dir; never hold the batch in memory.
+                reading_path = input_dir / f"{position}_reading.pdf"
+                qr_ar_path = input_dir / f"{position}_qr_ar.pdf"
+                for name, path in ((reading_name, reading_path), (qr_ar_name, qr_ar_path)):
+                    with input_zip.open(name) as src, open(path, "wb") as dst:
+                        shutil.copyfileobj(src, dst)
+            except Exception as exc:
+                record_failure(failures, entry, exc)
+                continue
+
+            entries.append(
+                {
+                    "student_name": student_name,
+                    "writing_score": writing_score,
+                    "manifest_entry": entry,
+                    "reading_path": reading_path,
+                    "qr_ar_path": qr_ar_path,
+                }
             )
 
+    return entries
+
+
+def collect_batch_results(
+    queue: WorkQueue,
+    job_id: str,
+    previews: Optional[PreviewStore] = None,
+    failures: Optional[List[Dict[str, Any]]] = None,
+) -> BytesIO:
+    """Assemble the batch ZIP from the files workers wrote for a finished job.
+
+    The job's queue rows and shared files are deleted once the ZIP is built.
+    """
+    failures = [] if failures is None else failures
+    try:
+        return _build_results_zip(queue, job_id, previews, failures)
+    finally:
+        queue.delete_job(job_id)
+
+
+def read_task_results(
+    result_dir: Path,
+    student_name: str,
+    with_preview: bool = True,
+) -> Tuple[Dict[str, bytes], Optional[Dict[str, Any]]]:
+    """Output files and (optionally) the preview entry a worker wrote for one task."""
+    files = {path.name: path.read_bytes() for path in sorted(result_dir.iterdir()) if path.is_file()}
+    if not with_preview:
+        return files, None
+
+    preview_files = {path.stem: path for path in (result_dir / "preview").iterdir()}
+    preview = {
+        "format": preview_files["reading"].suffix.lstrip("."),
+        "sheets": {sheet: preview_files[sheet].read_bytes() for sheet in ("reading", "qr_ar")},
+        "result": json.loads(files[f"{student_name}_marking_data.json"].decode("utf-8")),
+    }
+    return files, preview
+
+
+def _build_results_zip(
+    queue: WorkQueue,
+    job_id: str,
+    previews: Optional[PreviewStore],
+    failures: List[Dict[str, Any]],
+) -> BytesIO:
+    marked = 0
+    out_buf = BytesIO()
+
+    with zipfile.ZipFile(out_buf, "w", zipfile.ZIP_DEFLATED) as out_zip:
+        for task in queue.job_tasks(job_id):
+            if task["status"] != "done":
+                record_failure(failures, task["manifest_entry"], task["error"])
+                continue
+
+            student_name = task["student_name"]
+            try:
+                # Read everything first so a missing or corrupt result file
+                # fails this student alone, not the whole batch.
+                files, preview = read_task_results(
+                    Path(task["result_dir"]), student_name, with_preview=previews is not None
+                )
+            except Exception as exc:
+                record_failure(failures, task["manifest_entry"], exc)
+                continue
+
+            for name, data in files.items():
+                out_zip.writestr(f"{student_name}/{name}", data)
+            marked += 1
+
+            if preview is not None:
+                previews.put(student_name, preview)
+
+        write_error_report(out_zip, failures, marked)
+
     out_buf.seek(0)
     return out_buf
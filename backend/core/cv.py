@@ -1,28 +1,53 @@
-from typing import Dict, List
+from typing import TYPE_CHECKING, Dict, List, Tuple
 
-import numpy as np
-from PIL import Image
+from .questions_reading import QuestionROI, Rect
 
-from .questions_reading import QuestionROI
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from PIL import Image
 
 LETTERS = ["A", "B", "C", "D", "E"]
 
+# [(question id, [(option index, rect), ...]), ...]
+CompiledTemplate = List[Tuple[str, List[Tuple[int, Rect]]]]
 
-def detect_answers(image: Image.Image, questions: List[QuestionROI]) -> Dict[str, str]:
+# id(questions) -> (questions, compiled template). The list itself is kept so
+# a recycled id can never match a different template.
+_TEMPLATE_CACHE: Dict[int, Tuple[List[QuestionROI], CompiledTemplate]] = {}
+
+
+def compile_template(questions: List[QuestionROI]) -> CompiledTemplate:
+    """Return the usable option rects for each question, cached per ROI list."""
+    cached = _TEMPLATE_CACHE.get(id(questions))
+    if cached is not None and cached[0] is questions:
+        return cached[1]
+
+    compiled: CompiledTemplate = []
+    for question in questions:
+        options = [
+            (idx, rect)
+            for idx, rect in enumerate(question.options)
+            if rect != (0, 0, 0, 0)
+        ]
+        compiled.append((str(question.id), options))
+
+    _TEMPLATE_CACHE[id(questions)] = (questions, compiled)
+    return compiled
+
+
+def detect_answers(image: "Image.Image", questions: List[QuestionROI]) -> Dict[str, str]:
     """Return a dict mapping question id (as string) to chosen letter A-E."""
+    import numpy as np
+
     gray = image.convert("L")
     arr = np.array(gray)
 
     results: Dict[str, str] = {}
 
-    for question in questions:
+    for qid, options in compile_template(questions):
         darkest_idx = None
         darkest_val = None
 
-        for idx, (x1, y1, x2, y2) in enumerate(question.options):
-            if x1 == x2 == y1 == y2 == 0:
-                continue
-
+        for idx, (x1, y1, x2, y2) in options:
             crop = arr[y1:y2, x1:x2]
             if crop.size == 0:
                 continue
@@ -34,6 +59,6 @@ def detect_answers(image: Image.Image, questions: List[QuestionROI]) -> Dict[str
                 darkest_idx = idx
 
         if darkest_idx is not None:
-            results[str(question.id)] = LETTERS[darkest_idx]
+            results[qid] = LETTERS[darkest_idx]
 
     return results
@@ -1,12 +1,17 @@
-from typing import Any, Dict
+from typing import TYPE_CHECKING, Any, Dict
 
 from .cv import detect_answers
 from .marking_logic import compute_strengths_weaknesses, mark_section
 from .pdf_tools import pdf_to_images
+from .profiling import profile_stage
 from .questions_qr_ar import QUESTIONS_AR, QUESTIONS_QR
 from .questions_reading import QUESTIONS_READING
 
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from PIL import Image
 
+
+@profile_stage("engine.mark_papers")
 def mark_single_student_papers(
     reading_pdf_bytes: bytes,
     qr_ar_pdf_bytes: bytes,
@@ -21,12 +26,27 @@ def mark_single_student_papers(
     if not reading_images or not qr_ar_images:
         raise ValueError("PDF conversion returned no pages; ensure PDFs contain at least one page.")
 
-    reading_image = reading_images[0]
-    qr_ar_image = qr_ar_images[0]
+    return mark_student_images(
+        reading_images[0],
+        qr_ar_images[0],
+        answer_keys,
+        concept_map,
+    )
+
+
+@profile_stage("engine.mark")
+def mark_student_images(
+    reading_image: "Image.Image",
+    qr_ar_image: "Image.Image",
+    answer_keys: Dict[str, Any],
+    concept_map: Dict[str, Dict[str, Any]],
+) -> Dict[str, Any]:
+    """Mark already-rendered first pages, so callers can reuse their render."""
 
-    reading_answers = detect_answers(reading_image, QUESTIONS_READING)
-    qr_answers = detect_answers(qr_ar_image, QUESTIONS_QR)
-    ar_answers = detect_answers(qr_ar_image, QUESTIONS_AR)
+    with profile_stage("engine.detect"):
+        reading_answers = detect_answers(reading_image, QUESTIONS_READING)
+        qr_answers = detect_answers(qr_ar_image, QUESTIONS_QR)
+        ar_answers = detect_answers(qr_ar_image, QUESTIONS_AR)
 
     reading_key = answer_keys.get("reading", {})
     qr_ar_key = answer_keys.get("qr_ar", {})
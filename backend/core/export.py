@@ -1,17 +1,20 @@
 import json
 import zipfile
 from io import BytesIO
-from typing import Dict
-
-from PIL import Image
+from typing import TYPE_CHECKING, Dict
 
 from .pdf_tools import image_to_pdf_bytes
+from .profiling import profile_stage
+
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from PIL import Image
 
 
+@profile_stage("export.zip")
 def build_output_zip(
     student_name: str,
-    reading_img: Image.Image,
-    qr_ar_img: Image.Image,
+    reading_img: "Image.Image",
+    qr_ar_img: "Image.Image",
     result_payload: Dict,
 ) -> BytesIO:
     """Package annotated PDFs + JSON summary into a ZIP."""
@@ -1,17 +1,24 @@
 from io import BytesIO
-from typing import List
+from typing import TYPE_CHECKING, List
 
-from pdf2image import convert_from_bytes
-from PIL import Image
+from .profiling import profile_stage
 
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from PIL import Image
 
-def pdf_to_images(pdf_bytes: bytes, dpi: int = 300) -> List[Image.Image]:
+
+@profile_stage("pdf.rasterize")
+def pdf_to_images(pdf_bytes: bytes, dpi: int = 300) -> List["Image.Image"]:
     """Convert a single or multi page PDF (as bytes) into a list of Pillow images."""
+    # Deferred so importing the app does not pull in pdf2image / Pillow.
+    from pdf2image import convert_from_bytes
+
     images = convert_from_bytes(pdf_bytes, dpi=dpi)
     return images
 
 
-def image_to_pdf_bytes(image: Image.Image) -> bytes:
+@profile_stage("pdf.encode")
+def image_to_pdf_bytes(image: "Image.Image") -> bytes:
     """Convert a single Pillow image into a single page PDF as bytes."""
     buffer = BytesIO()
     image.save(buffer, format="PDF")
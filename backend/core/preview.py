@@ -0,0 +1,138 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from .profiling import profile_stage
+
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from PIL import Image
+
+PREVIEW_WIDTH = 900
+PREVIEW_FORMATS = {"webp": "image/webp", "png": "image/png"}
+DEFAULT_PREVIEW_LIMIT = 50
+
+# Single background thread for preview encoding, created on first use.
+_ENCODER: Optional[ThreadPoolExecutor] = None
+_ENCODER_LOCK = threading.Lock()
+
+
+def preview_format() -> str:
+    """WebP where this Pillow build supports it, PNG otherwise."""
+    from PIL import features
+
+    return "webp" if features.check("webp") else "png"
+
+
+def shrink_for_preview(image: "Image.Image", max_width: int = PREVIEW_WIDTH) -> "Image.Image":
+    """Cheap integer box reduction of a full-size page to at most max_width."""
+    preview = image.convert("RGB") if image.mode != "RGB" else image
+    factor = math.ceil(preview.width / max_width)
+    return preview.reduce(factor) if factor > 1 else preview.copy()
+
+
+def encode_preview(preview: "Image.Image") -> bytes:
+    """Encode an already shrunk page as WebP (PNG if unsupported)."""
+    buffer = BytesIO()
+    if preview_format() == "webp":
+        preview.save(buffer, format="WEBP", quality=80, method=4)
+    else:  # pragma: no cover - depends on Pillow build
+        preview.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def render_preview(image: "Image.Image", max_width: int = PREVIEW_WIDTH) -> bytes:
+    """Downscale an annotated page and encode it as WebP (PNG if unsupported)."""
+    return encode_preview(shrink_for_preview(image, max_width))
+
+
+def _encoder() -> ThreadPoolExecutor:
+    global _ENCODER
+    with _ENCODER_LOCK:
+        if _ENCODER is None:
+            _ENCODER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="preview")
+        return _ENCODER
+
+
+@profile_stage("preview.render")
+def build_preview_entry(
+    reading_img: "Image.Image",
+    qr_ar_img: "Image.Image",
+    result_payload: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Small renders + score JSON for one student, kept in the session.
+
+    Only the box reduction (a few ms) happens on the caller's thread; the
+    WebP encoding runs on a background thread and is awaited when a preview
+    is actually requested.
+    """
+    encoder = _encoder()
+    return {
+        "format": preview_format(),
+        "sheets": {
+            "reading": encoder.submit(encode_preview, shrink_for_preview(reading_img)),
+            "qr_ar": encoder.submit(encode_preview, shrink_for_preview(qr_ar_img)),
+        },
+        "result": result_payload,
+    }
+
+
+def sheet_bytes(entry: Dict[str, Any], sheet: str) -> bytes:
+    """Encoded preview for one sheet, waiting for a pending background encode."""
+    data = entry["sheets"][sheet]
+    if isinstance(data, Future):
+        data = data.result()
+        entry["sheets"][sheet] = data
+    return data
+
+
+class PreviewStore:
+    """Per-session previews keyed by student name, least recently used first out.
+
+    Bounded by ASET_PREVIEW_LIMIT students so a long session marking many
+    batches does not keep every preview alive.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or int(os.getenv("ASET_PREVIEW_LIMIT", DEFAULT_PREVIEW_LIMIT))
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, student_name: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[student_name] = entry
+            self._entries.move_to_end(student_name)
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                for data in evicted["sheets"].values():
+                    if isinstance(data, Future):
+                        data.cancel()
+
+    def get(self, student_name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(student_name)
+            if entry is not None:
+                self._entries.move_to_end(student_name)
+            return entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def convert_preview(data: bytes, source_format: str, target_format: str) -> bytes:
+    """Re-encode a stored preview when the client asks for another format."""
+    if source_format == target_format:
+        return data
+
+    from PIL import Image
+
+    buffer = BytesIO()
+    with Image.open(BytesIO(data)) as image:
+        if target_format == "webp":
+            image.save(buffer, format="WEBP", quality=80, method=4)
+        else:
+            image.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
@@ -0,0 +1,161 @@
+"""Opt-in per-stage memory accounting for the marking pipeline.
+
+Enable with ASET_PROFILE_MEMORY=1. Each request then gets a profile that the
+``profile_stage`` blocks in the core modules append to, recording the
+tracemalloc and RSS change and the peak traced allocation for every stage.
+Without the env var ``profile_stage`` does nothing beyond a context lookup.
+
+Pillow keeps pixel data outside Python's allocator, so page copies show up
+in the RSS figures rather than the traced ones. tracemalloc and RSS are
+process wide, so the figures are only attributable to one request when
+requests are profiled one at a time.
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional
+from uuid import uuid4
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows
+    resource = None
+
+PROFILE_HISTORY = 50
+
+_current_profile: ContextVar[Optional[Dict[str, Any]]] = ContextVar(
+    "aset_memory_profile", default=None
+)
+# Open stages, outermost first. Each tracks the highest traced memory seen
+# while it was open, since inner stages reset tracemalloc's peak counter.
+_open_stages: ContextVar[tuple] = ContextVar("aset_memory_profile_stages", default=())
+
+# Most recent finished profiles, newest last, for the debug endpoint.
+RECENT_PROFILES: Deque[Dict[str, Any]] = deque(maxlen=PROFILE_HISTORY)
+
+
+def profiling_enabled() -> bool:
+    return os.getenv("ASET_PROFILE_MEMORY") == "1"
+
+
+def current_rss_kb() -> Optional[int]:
+    """Resident set size right now (Linux /proc), or None if unavailable."""
+    try:
+        with open("/proc/self/statm") as fh:
+            resident_pages = int(fh.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+def peak_rss_kb() -> Optional[int]:
+    """Process lifetime peak RSS (ru_maxrss is KB on Linux, bytes on macOS)."""
+    if resource is None:  # pragma: no cover - Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def start_profile(label: str) -> Dict[str, Any]:
+    """Begin collecting stages for the current request / task."""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    profile = {
+        "id": str(uuid4()),
+        "label": label,
+        "started": time.time(),
+        "rss_start_kb": current_rss_kb(),
+        "stages": [],
+    }
+    _current_profile.set(profile)
+    return profile
+
+
+def finish_profile(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Close the profile, keep it for /debug/memory and return it."""
+    profile["seconds"] = round(time.time() - profile["started"], 4)
+    profile["rss_end_kb"] = current_rss_kb()
+    profile["peak_rss_kb"] = peak_rss_kb()
+    stages: List[Dict[str, Any]] = profile["stages"]
+    profile["peak_traced_kb"] = max((stage["peak_traced_kb"] for stage in stages), default=0)
+    _current_profile.set(None)
+    RECENT_PROFILES.append(profile)
+    return profile
+
+
+def summarize_profile(profile: Dict[str, Any]) -> str:
+    """Short header value: worst peak traced KB and RSS change per top-level stage.
+
+    Pillow's pixel buffers only show up in rss_delta_kb, so both are given.
+    """
+    worst: Dict[str, Dict[str, Optional[int]]] = {}
+    for stage in profile["stages"]:
+        if stage["depth"] != 0:
+            continue
+        figures = worst.setdefault(stage["stage"], {"traced_kb": 0, "rss_delta_kb": None})
+        figures["traced_kb"] = max(figures["traced_kb"], stage["peak_traced_kb"])
+        rss_delta = stage["rss_delta_kb"]
+        if rss_delta is not None and (
+            figures["rss_delta_kb"] is None or rss_delta > figures["rss_delta_kb"]
+        ):
+            figures["rss_delta_kb"] = rss_delta
+
+    parts = [
+        f"{name}(traced_kb={figures['traced_kb']},rss_delta_kb={figures['rss_delta_kb']})"
+        for name, figures in worst.items()
+    ]
+    return f"id={profile['id']}; peak_rss_kb={profile['peak_rss_kb']}; " + ", ".join(parts)
+
+
+def _carry_peak(open_stages: tuple) -> int:
+    """Fold tracemalloc's current peak into every open stage; returns it."""
+    _, peak = tracemalloc.get_traced_memory()
+    for frame in open_stages:
+        frame["peak"] = max(frame["peak"], peak)
+    return peak
+
+
+@contextmanager
+def profile_stage(name: str) -> Iterator[None]:
+    """Record memory use of the enclosed block in the active profile, if any."""
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+
+    outer = _open_stages.get()
+    _carry_peak(outer)
+    tracemalloc.reset_peak()
+
+    traced_before, _ = tracemalloc.get_traced_memory()
+    frame = {"peak": traced_before}
+    stages_token = _open_stages.set(outer + (frame,))
+    rss_before = current_rss_kb()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _carry_peak(outer + (frame,))
+        traced_after, _ = tracemalloc.get_traced_memory()
+        rss_after = current_rss_kb()
+        _open_stages.reset(stages_token)
+        profile["stages"].append(
+            {
+                "stage": name,
+                "depth": len(outer),
+                "seconds": round(time.perf_counter() - started, 4),
+                "traced_delta_kb": (traced_after - traced_before) // 1024,
+                "peak_traced_kb": (frame["peak"] - traced_before) // 1024,
+                "rss_delta_kb": (
+                    rss_after - rss_before
+                    if rss_after is not None and rss_before is not None
+                    else None
+                ),
+            }
+        )
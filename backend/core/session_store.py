@@ -3,6 +3,8 @@ from typing import Any, Dict
 from fastapi import Depends, HTTPException, Request, status
 from uuid import uuid4
 
+from .preview import PreviewStore
+
 SESSION_STORE: Dict[str, Dict[str, Any]] = {}
 
 
@@ -12,6 +14,8 @@ def create_session() -> str:
     SESSION_STORE[session_id] = {
         "answer_keys": {},
         "concept_map": None,
+        "previews": PreviewStore(),
+        "batches": {},
     }
     return session_id
 
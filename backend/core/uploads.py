@@ -0,0 +1,256 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from uuid import UUID, uuid4
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+HASH_BLOCK_SIZE = 1024 * 1024
+DEFAULT_UPLOAD_TTL_SECONDS = 24 * 3600
+# Metadata, received bytes, and the per-upload write lock.
+UPLOAD_SUFFIXES = (".json", ".part", ".lock")
+
+
+def get_upload_dir() -> Path:
+    """Chunk storage from ASET_UPLOAD_DIR, defaulting to the system temp dir."""
+    upload_dir = Path(
+        os.getenv("ASET_UPLOAD_DIR") or Path(tempfile.gettempdir()) / "aset-uploads"
+    )
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    return upload_dir
+
+
+class UploadNotFound(KeyError):
+    pass
+
+
+class UploadBusy(RuntimeError):
+    """Another request is writing to, finalizing or deleting this upload."""
+
+
+class UploadOffsetMismatch(ValueError):
+    """Chunk does not start where the stored data ends; carries the real offset."""
+
+    def __init__(self, received: int):
+        super().__init__(f"Expected chunk at offset {received}")
+        self.received = received
+
+
+def _is_upload_id(upload_id: str) -> bool:
+    try:
+        return str(UUID(upload_id)) == upload_id
+    except (TypeError, ValueError):
+        return False
+
+
+def _upload_path(upload_id: str, suffix: str) -> Path:
+    # Only ever build paths from canonical UUIDs, never from raw client input.
+    if not _is_upload_id(upload_id):
+        raise UploadNotFound(upload_id)
+    return get_upload_dir() / f"{upload_id}{suffix}"
+
+
+def _meta_path(upload_id: str) -> Path:
+    return _upload_path(upload_id, ".json")
+
+
+def _data_path(upload_id: str) -> Path:
+    return _upload_path(upload_id, ".part")
+
+
+# Used instead of lock files where fcntl is unavailable; single process only.
+_LOCAL_LOCKS: Dict[str, threading.Lock] = {}
+_LOCAL_LOCKS_GUARD = threading.Lock()
+
+
+@contextmanager
+def _upload_lock(upload_id: str) -> Iterator[None]:
+    """Exclusive, non-blocking lock on one upload; raises UploadBusy if held.
+
+    A lock file next to the upload also serialises API processes that share
+    ASET_UPLOAD_DIR.
+    """
+    if not _meta_path(upload_id).exists():
+        raise UploadNotFound(upload_id)
+
+    if fcntl is None:  # pragma: no cover - Windows
+        with _LOCAL_LOCKS_GUARD:
+            lock = _LOCAL_LOCKS.setdefault(upload_id, threading.Lock())
+        if not lock.acquire(blocking=False):
+            raise UploadBusy(upload_id)
+        try:
+            yield
+        finally:
+            lock.release()
+        return
+
+    with open(_upload_path(upload_id, ".lock"), "a") as fh:
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError as exc:
+            raise UploadBusy(upload_id) from exc
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def get_upload_ttl() -> int:
+    """Seconds an unused upload is kept, from ASET_UPLOAD_TTL (default a day)."""
+    return int(os.getenv("ASET_UPLOAD_TTL", DEFAULT_UPLOAD_TTL_SECONDS))
+
+
+def purge_expired_uploads(max_age: Optional[int] = None) -> int:
+    """Delete uploads untouched for ``max_age`` seconds; returns how many."""
+    max_age = get_upload_ttl() if max_age is None else max_age
+    cutoff = time.time() - max_age
+
+    last_touched: Dict[str, float] = {}
+    files: Dict[str, List[Path]] = {}
+    for path in get_upload_dir().iterdir():
+        # Leave anything in the directory that is not one of our upload files.
+        upload_id = path.stem
+        if path.suffix not in UPLOAD_SUFFIXES or not _is_upload_id(upload_id):
+            continue
+        try:
+            if not path.is_file():
+                continue
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            continue
+        last_touched[upload_id] = max(last_touched.get(upload_id, 0.0), mtime)
+        files.setdefault(upload_id, []).append(path)
+
+    purged = 0
+    for upload_id, mtime in last_touched.items():
+        if mtime >= cutoff:
+            continue
+        for path in files[upload_id]:
+            path.unlink(missing_ok=True)
+        purged += 1
+    return purged
+
+
+def create_upload(session_id: str, filename: str, total_size: int) -> Dict[str, Any]:
+    """Start a chunked upload and return its metadata."""
+    if total_size <= 0:
+        raise ValueError("total_size must be positive")
+
+    # Abandoned uploads are otherwise only removed once a batch consumes them.
+    purge_expired_uploads()
+
+    upload_id = str(uuid4())
+    meta = {
+        "upload_id": upload_id,
+        "session_id": session_id,
+        "filename": filename,
+        "total_size": total_size,
+        "complete": False,
+    }
+    _data_path(upload_id).touch()
+    _meta_path(upload_id).write_text(json.dumps(meta))
+    return meta
+
+
+def get_upload(upload_id: str, session_id: str) -> Dict[str, Any]:
+    """Metadata plus bytes received so far, for uploads owned by this session."""
+    try:
+        meta = json.loads(_meta_path(upload_id).read_text())
+    except (FileNotFoundError, ValueError) as exc:
+        raise UploadNotFound(upload_id) from exc
+
+    if meta["session_id"] != session_id:
+        raise UploadNotFound(upload_id)
+
+    meta["received"] = _data_path(upload_id).stat().st_size
+    return meta
+
+
+async def write_chunk(
+    upload_id: str,
+    session_id: str,
+    offset: int,
+    chunks: AsyncIterator[bytes],
+) -> int:
+    """Write a streamed chunk at ``offset``; returns total bytes received.
+
+    Chunks must arrive in order, so a client that lost its connection asks
+    for the upload status and resumes from ``received``. Writing at an
+    earlier offset drops everything stored from there on, which lets a
+    client redo a bad chunk or start over after a checksum mismatch.
+    """
+    get_upload(upload_id, session_id)
+    with _upload_lock(upload_id):
+        meta = get_upload(upload_id, session_id)
+        if meta["complete"]:
+            raise ValueError("Upload already finalized")
+        if offset > meta["received"]:
+            raise UploadOffsetMismatch(meta["received"])
+
+        received = offset
+        with open(_data_path(upload_id), "r+b") as fh:
+            fh.truncate(offset)
+            fh.seek(offset)
+            async for chunk in chunks:
+                received += len(chunk)
+                if received > meta["total_size"]:
+                    fh.truncate(offset)
+                    raise ValueError("Chunk runs past the declared total_size")
+                fh.write(chunk)
+
+    return received
+
+
+def finalize_upload(upload_id: str, session_id: str, sha256: str) -> Path:
+    """Verify size and checksum, then return the path of the assembled file."""
+    get_upload(upload_id, session_id)
+    with _upload_lock(upload_id):
+        return _finalize_locked(upload_id, session_id, sha256)
+
+
+def _finalize_locked(upload_id: str, session_id: str, sha256: str) -> Path:
+    meta = get_upload(upload_id, session_id)
+    data_path = _data_path(upload_id)
+
+    if meta["received"] != meta["total_size"]:
+        raise ValueError(
+            f"Upload incomplete: {meta['received']} of {meta['total_size']} bytes received"
+        )
+
+    digest = hashlib.sha256()
+    with open(data_path, "rb") as fh:
+        for block in iter(lambda: fh.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+
+    if digest.hexdigest() != sha256.lower():
+        raise ValueError("Checksum mismatch; upload the file again from offset 0")
+
+    meta["complete"] = True
+    del meta["received"]
+    _meta_path(upload_id).write_text(json.dumps(meta))
+    return data_path
+
+
+def get_completed_upload_path(upload_id: str, session_id: str) -> Path:
+    """Path of a finalized upload, ready to be opened as a ZIP."""
+    meta = get_upload(upload_id, session_id)
+    if not meta["complete"]:
+        raise ValueError("Upload has not been finalized")
+    return _data_path(upload_id)
+
+
+def delete_upload(upload_id: str, session_id: str) -> None:
+    get_upload(upload_id, session_id)
+    with _upload_lock(upload_id):
+        _data_path(upload_id).unlink(missing_ok=True)
+        _meta_path(upload_id).unlink(missing_ok=True)
+        _upload_path(upload_id, ".lock").unlink(missing_ok=True)
@@ -0,0 +1,27 @@
+from typing import Dict
+
+from .annotate import get_font
+from .cv import compile_template, detect_answers
+from .pdf_tools import image_to_pdf_bytes, pdf_to_images
+from .questions_qr_ar import QUESTIONS_AR, QUESTIONS_QR
+from .questions_reading import QUESTIONS_READING
+
+
+def warm_up(dpi: int = 72) -> Dict[str, bool]:
+    """Prime the rasterizer, detector and font caches before the first request.
+
+    Renders a tiny blank page through the same code paths a real upload uses,
+    so the first staff request does not pay for imports and cache fills.
+    """
+    from PIL import Image
+
+    compile_template(QUESTIONS_READING)
+    compile_template(QUESTIONS_QR)
+    compile_template(QUESTIONS_AR)
+    get_font()
+
+    blank_pdf = image_to_pdf_bytes(Image.new("RGB", (64, 64), "white"))
+    images = pdf_to_images(blank_pdf, dpi=dpi)
+    detect_answers(images[0], QUESTIONS_READING)
+
+    return {"rasterizer": bool(images), "detector": True, "font": True}
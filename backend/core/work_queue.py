@@ -0,0 +1,243 @@
+import json
+import os
+import shutil
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from uuid import uuid4
+
+DEFAULT_LEASE_SECONDS = 120
+DEFAULT_MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    answer_keys TEXT NOT NULL,
+    concept_map TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    job_id TEXT NOT NULL REFERENCES jobs(id),
+    position INTEGER NOT NULL,
+    student_name TEXT NOT NULL,
+    writing_score TEXT,
+    manifest_entry TEXT,
+    reading_path TEXT NOT NULL,
+    qr_ar_path TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    result_dir TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks(status, lease_expires);
+CREATE INDEX IF NOT EXISTS tasks_job ON tasks(job_id, position);
+"""
+
+
+def get_queue_dir() -> Optional[Path]:
+    """Shared queue directory from ASET_QUEUE_DIR, or None when queueing is off."""
+    queue_dir = os.getenv("ASET_QUEUE_DIR")
+    return Path(queue_dir) if queue_dir else None
+
+
+class WorkQueue:
+    """Per-student marking tasks in a SQLite file that several workers share.
+
+    Workers claim a task by taking a time-limited lease. A worker that dies
+    simply lets its lease expire, after which another worker picks the task
+    up again, up to ``max_attempts`` claims in total.
+    """
+
+    def __init__(
+        self,
+        queue_dir: Path,
+        lease_seconds: int = DEFAULT_LEASE_SECONDS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ):
+        self.queue_dir = Path(queue_dir)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.queue_dir.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self, immediate: bool = False) -> Iterator[sqlite3.Connection]:
+        """Open a connection; with ``immediate`` the block runs as one write
+        transaction so concurrent workers cannot claim the same task."""
+        conn = sqlite3.connect(
+            self.queue_dir / "queue.sqlite3",
+            timeout=30,
+            isolation_level=None,
+        )
+        conn.row_factory = sqlite3.Row
+        try:
+            if immediate:
+                conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            if immediate:
+                conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def create_job_dir(self) -> Tuple[str, Path]:
+        """Reserve a job id and the shared directory its input PDFs go in."""
+        job_id = str(uuid4())
+        input_dir = self.queue_dir / "inputs" / job_id
+        input_dir.mkdir(parents=True)
+        return job_id, input_dir
+
+    def enqueue_job(
+        self,
+        job_id: str,
+        entries: List[Dict[str, Any]],
+        answer_keys: Dict[str, Any],
+        concept_map: Dict[str, Any],
+    ) -> str:
+        """Queue one task per entry. Each entry needs student_name,
+        writing_score, reading_path and qr_ar_path (files already written
+        under the job's input dir, so workers on other hosts can read them),
+        plus the optional manifest_entry it came from."""
+        rows = [
+            (
+                str(uuid4()),
+                job_id,
+                position,
+                entry["student_name"],
+                entry.get("writing_score"),
+                json.dumps(entry.get("manifest_entry")),
+                str(entry["reading_path"]),
+                str(entry["qr_ar_path"]),
+            )
+            for position, entry in enumerate(entries)
+        ]
+
+        with self._connect(immediate=True) as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, created, answer_keys, concept_map) VALUES (?, ?, ?, ?)",
+                (job_id, time.time(), json.dumps(answer_keys), json.dumps(concept_map)),
+            )
+            conn.executemany(
+                "INSERT INTO tasks (id, job_id, position, student_name, writing_score,"
+                " manifest_entry, reading_path, qr_ar_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+        return job_id
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Lease the next pending (or abandoned) task, or return None."""
+        while True:
+            now = time.time()
+            with self._connect(immediate=True) as conn:
+                row = conn.execute(
+                    "SELECT tasks.*, jobs.answer_keys, jobs.concept_map FROM tasks"
+                    " JOIN jobs ON jobs.id = tasks.job_id"
+                    " WHERE tasks.status = 'pending'"
+                    " OR (tasks.status = 'leased' AND tasks.lease_expires < ?)"
+                    " ORDER BY jobs.created, tasks.position LIMIT 1",
+                    (now,),
+                ).fetchone()
+
+                if row is None:
+                    return None
+
+                if row["attempts"] >= self.max_attempts:
+                    # Abandoned by a worker on its final attempt; give up on it.
+                    conn.execute(
+                        "UPDATE tasks SET status = 'failed', lease_owner = NULL,"
+                        " error = COALESCE(error, 'Worker lease expired') WHERE id = ?",
+                        (row["id"],),
+                    )
+                    continue
+
+                conn.execute(
+                    "UPDATE tasks SET status = 'leased', attempts = attempts + 1,"
+                    " lease_owner = ?, lease_expires = ? WHERE id = ?",
+                    (worker_id, now + self.lease_seconds, row["id"]),
+                )
+
+            task = dict(row)
+            task["attempts"] += 1
+            task["lease_owner"] = worker_id
+            task["answer_keys"] = json.loads(task["answer_keys"])
+            task["concept_map"] = json.loads(task["concept_map"])
+            return task
+
+    def renew_lease(self, task_id: str, worker_id: str) -> bool:
+        """Push back the lease on a task this worker still owns.
+
+        Returns False once another worker has re-claimed the task.
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET lease_expires = ?"
+                " WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                (time.time() + self.lease_seconds, task_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, task_id: str, worker_id: str, result_dir: Path) -> bool:
+        """Mark a leased task done. Returns False if the lease was lost.
+
+        A result that arrives after the lease expired is still accepted as
+        long as no other worker has re-claimed the task in the meantime.
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET status = 'done', result_dir = ?, error = NULL,"
+                " lease_owner = NULL WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                (str(result_dir), task_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, task_id: str, worker_id: str, error: str) -> None:
+        """Record a failed attempt; the task is retried until max_attempts."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE tasks SET error = ?, lease_owner = NULL, lease_expires = NULL,"
+                " status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END"
+                " WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                (error, self.max_attempts, task_id, worker_id),
+            )
+
+    def job_tasks(self, job_id: str) -> List[Dict[str, Any]]:
+        """All tasks for a job in manifest order."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, student_name, writing_score, manifest_entry, status, attempts,"
+                " result_dir, error FROM tasks WHERE job_id = ? ORDER BY position",
+                (job_id,),
+            ).fetchall()
+
+        tasks = [dict(row) for row in rows]
+        for task in tasks:
+            task["manifest_entry"] = json.loads(task["manifest_entry"] or "null")
+        return tasks
+
+    def job_finished(self, job_id: str) -> bool:
+        return all(
+            task["status"] in ("done", "failed") for task in self.job_tasks(job_id)
+        )
+
+    def delete_job(self, job_id: str) -> None:
+        """Drop a job's rows and its input and result files.
+
+        Any task still leased is dropped too; its worker's complete() then
+        returns False and the worker discards what it wrote.
+        """
+        with self._connect(immediate=True) as conn:
+            conn.execute("DELETE FROM tasks WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+        for kind in ("inputs", "results"):
+            shutil.rmtree(self.queue_dir / kind / job_id, ignore_errors=True)
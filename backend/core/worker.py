@@ -0,0 +1,178 @@
+"""Standalone marking worker.
+
+Run one or more on any host that can see the shared queue directory:
+    python -m core.worker --queue-dir /srv/aset-queue --processes 4
+
+Each process claims one student at a time from the SQLite work queue, marks
+and annotates both sheets, and writes the per-student output files under
+``results/<job_id>/<task_id>/<attempt>/`` for the API to collect.
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from .batch import mark_student, student_output_files
+from .preview import preview_format, render_preview
+from .profiling import finish_profile, profiling_enabled, start_profile, summarize_profile
+from .work_queue import DEFAULT_LEASE_SECONDS, DEFAULT_MAX_ATTEMPTS, WorkQueue, get_queue_dir
+
+
+def process_task(queue: WorkQueue, task: dict) -> Path:
+    """Mark one claimed task and write its output files; returns the result dir."""
+    student_name = task["student_name"]
+    payload, reading_img_annot, qr_ar_img_annot = mark_student(
+        student_name,
+        task["writing_score"],
+        Path(task["reading_path"]).read_bytes(),
+        Path(task["qr_ar_path"]).read_bytes(),
+        task["answer_keys"],
+        task["concept_map"],
+    )
+
+    # One directory per attempt so a slow worker that lost its lease can
+    # never overwrite the files of the worker that took over.
+    result_dir = queue.queue_dir / "results" / task["job_id"] / task["id"] / str(task["attempts"])
+    (result_dir / "preview").mkdir(parents=True, exist_ok=True)
+
+    for name, data in student_output_files(
+        student_name, reading_img_annot, qr_ar_img_annot, payload
+    ).items():
+        (result_dir / name).write_bytes(data)
+
+    suffix = preview_format()
+    (result_dir / "preview" / f"reading.{suffix}").write_bytes(render_preview(reading_img_annot))
+    (result_dir / "preview" / f"qr_ar.{suffix}").write_bytes(render_preview(qr_ar_img_annot))
+
+    return result_dir
+
+
+@contextmanager
+def lease_heartbeat(queue: WorkQueue, task_id: str, worker_id: str) -> Iterator[None]:
+    """Keep renewing the task's lease while the enclosed block runs.
+
+    Renews at a third of the lease length, so a slow student is never
+    re-claimed from a worker that is still alive.
+    """
+    stopped = threading.Event()
+    interval = max(queue.lease_seconds / 3, 0.1)
+
+    def beat() -> None:
+        while not stopped.wait(interval):
+            if not queue.renew_lease(task_id, worker_id):
+                return
+
+    thread = threading.Thread(target=beat, name=f"lease-{task_id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def run_worker(
+    queue: WorkQueue,
+    worker_id: Optional[str] = None,
+    poll_interval: float = 1.0,
+    stop_when_idle: bool = False,
+) -> int:
+    """Claim and process tasks until stopped; returns the number completed."""
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    completed = 0
+
+    while True:
+        task = queue.claim(worker_id)
+        if task is None:
+            if stop_when_idle:
+                return completed
+            time.sleep(poll_interval)
+            continue
+
+        profile = start_profile(f"task {task['id']}") if profiling_enabled() else None
+        try:
+            with lease_heartbeat(queue, task["id"], worker_id):
+                result_dir = process_task(queue, task)
+        except Exception as exc:
+            queue.fail(task["id"], worker_id, f"{exc.__class__.__name__}: {exc}")
+            traceback.print_exc()
+            continue
+        finally:
+            if profile is not None:
+                finish_profile(profile)
+                print(f"[{worker_id}] memory: {summarize_profile(profile)}", flush=True)
+
+        if queue.complete(task["id"], worker_id, result_dir):
+            completed += 1
+        else:
+            # Re-claimed by another worker or the job was dropped; nobody
+            # will ever read this attempt's files.
+            shutil.rmtree(result_dir, ignore_errors=True)
+
+
+def _worker_process(queue_dir: str, lease_seconds: int, max_attempts: int, stop_when_idle: bool) -> None:
+    queue = WorkQueue(Path(queue_dir), lease_seconds=lease_seconds, max_attempts=max_attempts)
+    run_worker(queue, stop_when_idle=stop_when_idle)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ASET marking worker")
+    parser.add_argument("--queue-dir", default=None, help="Defaults to ASET_QUEUE_DIR")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--lease-seconds", type=int, default=DEFAULT_LEASE_SECONDS)
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS)
+    parser.add_argument(
+        "--stop-when-idle",
+        action="store_true",
+        help="Exit once the queue is empty instead of polling forever",
+    )
+    args = parser.parse_args()
+
+    queue_dir = args.queue_dir or get_queue_dir()
+    if queue_dir is None:
+        parser.error("--queue-dir or ASET_QUEUE_DIR is required")
+
+    # Create the schema once before the processes race for it.
+    WorkQueue(Path(queue_dir))
+
+    worker_args = (str(queue_dir), args.lease_seconds, args.max_attempts, args.stop_when_idle)
+    if args.processes == 1:
+        _worker_process(*worker_args)
+        return
+
+    processes = [
+        multiprocessing.Process(target=_worker_process, args=worker_args, daemon=True)
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+
+    # Installed after the children start so they keep the default handlers.
+    # Their leased tasks expire and are picked up by the remaining workers.
+    def shutdown(signum, frame) -> None:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
+        sys.exit(128 + signum)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
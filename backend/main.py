@@ -1,9 +1,14 @@
-from fastapi import FastAPI
+import os
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 
+from core.profiling import finish_profile, profiling_enabled, start_profile, summarize_profile
 from routes.auth import router as auth_router
 from routes.config import router as config_router
+from routes.debug import router as debug_router
 from routes.marking import router as marking_router
+from routes.uploads import router as uploads_router
 
 app = FastAPI()
 
@@ -13,11 +18,41 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Batch-ID", "X-Batch-Failed", "X-Memory-Profile"],
 )
 
 app.include_router(auth_router)
 app.include_router(config_router)
 app.include_router(marking_router)
+app.include_router(uploads_router)
+
+if profiling_enabled():
+    # Opt-in: ASET_PROFILE_MEMORY=1 records per-stage tracemalloc / RSS figures
+    # for each request, summarised in X-Memory-Profile and kept for /debug/memory.
+    app.include_router(debug_router)
+
+    @app.middleware("http")
+    async def profile_memory(request: Request, call_next):
+        if request.url.path.startswith("/debug"):
+            return await call_next(request)
+
+        profile = start_profile(f"{request.method} {request.url.path}")
+        try:
+            response = await call_next(request)
+        finally:
+            finish_profile(profile)
+        response.headers["X-Memory-Profile"] = summarize_profile(profile)
+        return response
+
+
+@app.on_event("startup")
+def warm_up_marking_pipeline():
+    # Opt-in: set ASET_WARMUP=1 to prime pdf2image, Pillow and NumPy before
+    # the first request instead of on it.
+    if os.getenv("ASET_WARMUP") == "1":
+        from core.warmup import warm_up
+
+        warm_up()
 
 
 @app.get("/health")
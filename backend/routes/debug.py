@@ -0,0 +1,27 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from core.profiling import RECENT_PROFILES
+from core.session_store import get_session
+
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+
+@router.get("/memory")
+def memory_profiles(
+    profile_id: Optional[str] = None,
+    session: dict = Depends(get_session),
+):
+    """Recent per-stage memory profiles (only mounted with ASET_PROFILE_MEMORY=1)."""
+    if profile_id is None:
+        return {"profiles": list(RECENT_PROFILES)}
+
+    for profile in RECENT_PROFILES:
+        if profile["id"] == profile_id:
+            return profile
+
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Profile {profile_id} not found (only the last {RECENT_PROFILES.maxlen} are kept)",
+    )
@@ -1,5 +1,14 @@
+import asyncio
+import copy
 import json
-from typing import Dict
+import os
+import time
+import zipfile
+from concurrent.futures import CancelledError
+from io import BytesIO
+from typing import Dict, List, Literal, Optional, Tuple
+from urllib.parse import quote
+from uuid import uuid4
 
 from fastapi import (
     APIRouter,
@@ -10,19 +19,45 @@ from fastapi import (
     UploadFile,
     status,
 )
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
-from core.annotate import annotate_incorrect_bubbles, write_section_score
-from core.batch import process_batch_zip
-from core.engine import mark_single_student_papers
+from core.annotate import annotate_student_sheets
+from core.batch import (
+    ZipSource,
+    collect_batch_results,
+    enqueue_batch_zip,
+    process_batch_zip,
+)
+from core.engine import mark_student_images
 from core.export import build_output_zip
 from core.pdf_tools import pdf_to_images
-from core.questions_qr_ar import QUESTIONS_AR, QUESTIONS_QR
-from core.questions_reading import QUESTIONS_READING
-from core.session_store import get_session
+from core.preview import (
+    PREVIEW_FORMATS,
+    build_preview_entry,
+    convert_preview,
+    preview_format,
+    sheet_bytes,
+)
+from core.session_store import get_session, get_session_id_from_header
+from core.uploads import (
+    UploadBusy,
+    UploadNotFound,
+    delete_upload,
+    get_completed_upload_path,
+)
+from core.work_queue import WorkQueue, get_queue_dir
 
 router = APIRouter(prefix="/mark", tags=["mark"])
 
+# Only used when ASET_QUEUE_DIR hands batches to separate worker processes.
+QUEUE_POLL_SECONDS = 0.5
+QUEUE_TIMEOUT_SECONDS = int(os.getenv("ASET_QUEUE_TIMEOUT", "3600"))
+
+# Batches with failed students kept per session for /batch/{id}/retry,
+# oldest dropped first, like the preview store.
+BATCH_HISTORY_LIMIT = int(os.getenv("ASET_BATCH_LIMIT", "20"))
+
 
 @router.post("/single-student")
 async def mark_single_student(
@@ -72,9 +107,9 @@ async def mark_single_student(
     qr_ar_image = qr_ar_images[0]
 
     try:
-        result = mark_single_student_papers(
-            reading_bytes,
-            qr_ar_bytes,
+        result = mark_student_images(
+            reading_image,
+            qr_ar_image,
             session["answer_keys"],
             session.get("concept_map") or {},
         )
@@ -84,38 +119,10 @@ async def mark_single_student(
             detail=f"Marking engine error: {exc}",
         ) from exc
 
-    # Annotate reading sheet
-    reading_img_annot = annotate_incorrect_bubbles(
+    reading_img_annot, qr_ar_img_annot = annotate_student_sheets(
         reading_image,
-        result["reading"]["answers"],
-        result["reading"]["results"],
-        QUESTIONS_READING,
-    )
-    reading_img_annot = write_section_score(
-        reading_img_annot,
-        "Reading",
-        result["reading"]["correct"],
-        result["reading"]["total"],
-    )
-
-    # Annotate QR/AR sheet (apply sequentially to cover both subjects)
-    qr_ar_img_annot = annotate_incorrect_bubbles(
         qr_ar_image,
-        result["qr"]["answers"],
-        result["qr"]["results"],
-        QUESTIONS_QR,
-    )
-    qr_ar_img_annot = annotate_incorrect_bubbles(
-        qr_ar_img_annot,
-        result["ar"]["answers"],
-        result["ar"]["results"],
-        QUESTIONS_AR,
-    )
-    qr_ar_img_annot = write_section_score(
-        qr_ar_img_annot,
-        "QR/AR",
-        result["qr"]["correct"] + result["ar"]["correct"],
-        result["qr"]["total"] + result["ar"]["total"],
+        result,
     )
 
     result_payload = {
@@ -124,6 +131,11 @@ async def mark_single_student(
         **result,
     }
 
+    session["previews"].put(
+        student_name,
+        build_preview_entry(reading_img_annot, qr_ar_img_annot, result_payload),
+    )
+
     zip_buffer = build_output_zip(
         student_name,
         reading_img_annot,
@@ -144,17 +156,17 @@ async def mark_single_student(
 
 @router.post("/batch")
 async def mark_batch(
-    files_zip: UploadFile = File(...),
+    files_zip: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None),
     manifest: str = Form(...),
     session: Dict = Depends(get_session),
+    session_id: str = Depends(get_session_id_from_header),
 ):
-    if files_zip.content_type not in (
-        "application/zip",
-        "application/x-zip-compressed",
-    ):
+    # Either a regular multipart ZIP or a finalized chunked upload (/uploads).
+    if (files_zip is None) == (upload_id is None):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="files_zip must be a ZIP",
+            detail="Provide exactly one of files_zip or upload_id",
         )
 
     try:
@@ -173,24 +185,190 @@ async def mark_batch(
             detail="Answer keys not loaded for this session.",
         )
 
-    zip_bytes = await files_zip.read()
+    # Snapshot the keys so a retry marks exactly as this batch did, even if
+    # the session's keys are replaced in the meantime.
+    answer_keys = copy.deepcopy(session.get("answer_keys", {}))
+    concept_map = copy.deepcopy(session.get("concept_map") or {})
 
-    try:
-        out_buf = process_batch_zip(
-            zip_bytes,
-            manifest_data,
-            session.get("answer_keys", {}),
-            session.get("concept_map") or {},
+    zip_source = _resolve_zip_source(files_zip, upload_id, session_id)
+    out_buf, failures = await _mark_batch_entries(
+        zip_source, manifest_data, answer_keys, concept_map, session
+    )
+
+    batch_id = str(uuid4())
+    if failures:
+        _remember_batch(
+            session,
+            session_id,
+            batch_id,
+            {
+                "failures": failures,
+                "answer_keys": answer_keys,
+                "concept_map": concept_map,
+                "upload_id": upload_id,
+            },
+        )
+    _release_unused_uploads(session, session_id, [upload_id])
+
+    return _batch_response(out_buf, batch_id, failures, "batch_marked_output.zip")
+
+
+@router.post("/batch/{batch_id}/retry")
+async def retry_batch(
+    batch_id: str,
+    files_zip: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None),
+    session: Dict = Depends(get_session),
+    session_id: str = Depends(get_session_id_from_header),
+):
+    """Re-mark only the students that failed in an earlier batch.
+
+    Uses the answer keys and concept map the batch was first marked with.
+    Batches sent as a chunked upload reuse that archive; otherwise the
+    (possibly corrected) ZIP must be sent again as files_zip or upload_id.
+    """
+    batch = session.get("batches", {}).get(batch_id)
+    if batch is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown batch {batch_id} or it has no failed students to retry",
         )
-    except FileNotFoundError as exc:
+
+    if files_zip is not None and upload_id is not None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Missing file in ZIP: {exc}",
-        ) from exc
-    except ValueError as exc:
+            detail="Provide at most one of files_zip or upload_id",
+        )
+
+    if files_zip is None and upload_id is None:
+        upload_id = batch["upload_id"]
+        if upload_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Original ZIP was not kept; send files_zip or upload_id again",
+            )
+
+    zip_source = _resolve_zip_source(files_zip, upload_id, session_id)
+    manifest_data = [failure["manifest_entry"] for failure in batch["failures"]]
+    out_buf, failures = await _mark_batch_entries(
+        zip_source,
+        manifest_data,
+        batch["answer_keys"],
+        batch["concept_map"],
+        session,
+    )
+
+    previous_upload_id = batch["upload_id"]
+    if failures:
+        batch["failures"] = failures
+        batch["upload_id"] = upload_id
+        _remember_batch(session, session_id, batch_id, batch)
+    else:
+        session["batches"].pop(batch_id, None)
+    _release_unused_uploads(session, session_id, [previous_upload_id, upload_id])
+
+    return _batch_response(out_buf, batch_id, failures, "batch_retry_output.zip")
+
+
+def _remember_batch(session: Dict, session_id: str, batch_id: str, batch: Dict) -> None:
+    """Keep a batch with failures for retry, evicting the oldest past the limit."""
+    batches = session.setdefault("batches", {})
+    batches.pop(batch_id, None)
+    batches[batch_id] = batch
+
+    evicted = []
+    while len(batches) > BATCH_HISTORY_LIMIT:
+        oldest = next(iter(batches))
+        evicted.append(batches.pop(oldest)["upload_id"])
+    _release_unused_uploads(session, session_id, evicted)
+
+
+def _release_unused_uploads(
+    session: Dict,
+    session_id: str,
+    upload_ids: List[Optional[str]],
+) -> None:
+    """Delete chunked uploads that no batch of this session can retry from."""
+    in_use = {batch["upload_id"] for batch in session.get("batches", {}).values()}
+    for upload_id in upload_ids:
+        if upload_id is None or upload_id in in_use:
+            continue
+        try:
+            delete_upload(upload_id, session_id)
+        except (UploadBusy, UploadNotFound):
+            # Left for the ASET_UPLOAD_TTL purge.
+            pass
+
+
+def _resolve_zip_source(
+    files_zip: Optional[UploadFile],
+    upload_id: Optional[str],
+    session_id: str,
+) -> ZipSource:
+    if upload_id is not None:
+        try:
+            return get_completed_upload_path(upload_id, session_id)
+        except UploadNotFound as exc:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Unknown upload {upload_id}",
+            ) from exc
+        except ValueError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(exc),
+            ) from exc
+
+    if files_zip.content_type not in (
+        "application/zip",
+        "application/x-zip-compressed",
+    ):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(exc),
+            detail="files_zip must be a ZIP",
+        )
+
+    # Starlette spools large uploads to disk; read the ZIP from there.
+    return files_zip.file
+
+
+async def _mark_batch_entries(
+    zip_source: ZipSource,
+    manifest_data: list,
+    answer_keys: Dict,
+    concept_map: Dict,
+    session: Dict,
+) -> Tuple[BytesIO, List[Dict]]:
+    """Mark a batch in-process or on the worker queue; returns (zip, failures)."""
+    failures: List[Dict] = []
+    queue_dir = get_queue_dir()
+
+    try:
+        if queue_dir is not None:
+            out_buf = await _run_queued_batch(
+                WorkQueue(queue_dir),
+                zip_source,
+                manifest_data,
+                answer_keys,
+                concept_map,
+                session,
+                failures,
+            )
+        else:
+            out_buf = process_batch_zip(
+                zip_source,
+                manifest_data,
+                answer_keys,
+                concept_map,
+                previews=session["previews"],
+                failures=failures,
+            )
+    except HTTPException:
+        raise
+    except zipfile.BadZipFile as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"files_zip is not a valid ZIP: {exc}",
         ) from exc
     except Exception as exc:  # pragma: no cover - batch processing errors
         raise HTTPException(
@@ -198,10 +376,123 @@ async def mark_batch(
             detail=f"Batch processing error: {exc}",
         ) from exc
 
+    return out_buf, failures
+
+
+def _batch_response(
+    out_buf: BytesIO,
+    batch_id: str,
+    failures: List[Dict],
+    filename: str,
+) -> StreamingResponse:
     return StreamingResponse(
         out_buf,
         media_type="application/zip",
         headers={
-            "Content-Disposition": 'attachment; filename="batch_marked_output.zip"'
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Batch-ID": batch_id,
+            "X-Batch-Failed": str(len(failures)),
         },
     )
+
+
+async def _run_queued_batch(
+    queue: WorkQueue,
+    zip_source: ZipSource,
+    manifest_data: list,
+    answer_keys: Dict,
+    concept_map: Dict,
+    session: Dict,
+    failures: List[Dict],
+) -> BytesIO:
+    """Hand the batch to the marking workers and wait for them to finish it.
+
+    Staging the inputs, polling SQLite and building the output ZIP all block,
+    so they run in the threadpool and the API keeps answering meanwhile.
+    """
+    job_id = await run_in_threadpool(
+        enqueue_batch_zip,
+        queue,
+        zip_source,
+        manifest_data,
+        answer_keys,
+        concept_map,
+        failures=failures,
+    )
+
+    deadline = time.monotonic() + QUEUE_TIMEOUT_SECONDS
+    try:
+        while not await run_in_threadpool(queue.job_finished, job_id):
+            if time.monotonic() > deadline:
+                raise HTTPException(
+                    status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                    detail=f"Batch job {job_id} did not finish; are marking workers running?",
+                )
+            await asyncio.sleep(QUEUE_POLL_SECONDS)
+    except BaseException:
+        # Timed out or the client went away: nobody will collect this job.
+        await run_in_threadpool(queue.delete_job, job_id)
+        raise
+
+    return await run_in_threadpool(
+        collect_batch_results,
+        queue,
+        job_id,
+        previews=session["previews"],
+        failures=failures,
+    )
+
+
+def _preview_not_found(student_name: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"No marked result for {student_name} in this session.",
+    )
+
+
+def _get_preview(session: Dict, student_name: str) -> Dict:
+    preview = session["previews"].get(student_name)
+    if preview is None:
+        raise _preview_not_found(student_name)
+    return preview
+
+
+@router.get("/preview/{student_name:path}")
+def preview_result(
+    student_name: str,
+    sheet: Optional[Literal["reading", "qr_ar"]] = None,
+    format: Optional[Literal["webp", "png"]] = None,
+    session: Dict = Depends(get_session),
+):
+    """Scores and sheet URLs for a student, or one sheet image with ?sheet=.
+
+    The name is matched as a path so names containing "/" still resolve.
+    """
+    preview = _get_preview(session, student_name)
+
+    if sheet is None:
+        return {
+            **preview["result"],
+            "sheets": {
+                name: f"/mark/preview/{quote(student_name, safe='')}?sheet={name}"
+                for name in preview["sheets"]
+            },
+        }
+
+    target_format = format or preview["format"]
+    if target_format == "webp" and preview_format() != "webp":
+        # Pillow built without WebP: serve PNG rather than failing.
+        target_format = "png"
+
+    try:
+        data = sheet_bytes(preview, sheet)
+    except CancelledError as exc:
+        # Evicted from the store (which cancels pending encodes) after we got it.
+        raise _preview_not_found(student_name) from exc
+
+    data = convert_preview(data, preview["format"], target_format)
+    return Response(
+        content=data,
+        media_type=PREVIEW_FORMATS[target_format],
+        headers={"Cache-Control": "private, max-age=300"},
+    )
@@ -0,0 +1,125 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from pydantic import BaseModel
+
+from core.session_store import get_session_id_from_header
+from core.uploads import (
+    UploadBusy,
+    UploadNotFound,
+    UploadOffsetMismatch,
+    create_upload,
+    delete_upload,
+    finalize_upload,
+    get_upload,
+    write_chunk,
+)
+
+router = APIRouter(prefix="/uploads", tags=["uploads"])
+
+
+class UploadInitRequest(BaseModel):
+    filename: str
+    total_size: int
+
+
+class UploadFinalizeRequest(BaseModel):
+    sha256: str
+
+
+def _not_found(upload_id: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Unknown upload {upload_id}",
+    )
+
+
+def _busy(upload_id: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"Upload {upload_id} is being written by another request",
+    )
+
+
+@router.post("/init")
+def init_upload(
+    payload: UploadInitRequest,
+    session_id: str = Depends(get_session_id_from_header),
+):
+    try:
+        meta = create_upload(session_id, payload.filename, payload.total_size)
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc),
+        ) from exc
+    return {"upload_id": meta["upload_id"], "received": 0}
+
+
+@router.get("/{upload_id}")
+def upload_status(
+    upload_id: str,
+    session_id: str = Depends(get_session_id_from_header),
+):
+    try:
+        return get_upload(upload_id, session_id)
+    except UploadNotFound as exc:
+        raise _not_found(upload_id) from exc
+
+
+@router.put("/{upload_id}")
+async def put_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    session_id: str = Depends(get_session_id_from_header),
+):
+    try:
+        received = await write_chunk(upload_id, session_id, offset, request.stream())
+    except UploadNotFound as exc:
+        raise _not_found(upload_id) from exc
+    except UploadBusy as exc:
+        raise _busy(upload_id) from exc
+    except UploadOffsetMismatch as exc:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": str(exc), "received": exc.received},
+        ) from exc
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc),
+        ) from exc
+    return {"upload_id": upload_id, "received": received}
+
+
+@router.post("/{upload_id}/finalize")
+def finalize(
+    upload_id: str,
+    payload: UploadFinalizeRequest,
+    session_id: str = Depends(get_session_id_from_header),
+):
+    try:
+        finalize_upload(upload_id, session_id, payload.sha256)
+    except UploadNotFound as exc:
+        raise _not_found(upload_id) from exc
+    except UploadBusy as exc:
+        raise _busy(upload_id) from exc
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc),
+        ) from exc
+    return {"upload_id": upload_id, "status": "complete"}
+
+
+@router.delete("/{upload_id}")
+def cancel_upload(
+    upload_id: str,
+    session_id: str = Depends(get_session_id_from_header),
+):
+    try:
+        delete_upload(upload_id, session_id)
+    except UploadNotFound as exc:
+        raise _not_found(upload_id) from exc
+    except UploadBusy as exc:
+        raise _busy(upload_id) from exc
+    return {"status": "ok"}
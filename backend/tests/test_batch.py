@@ -0,0 +1,86 @@
+import json
+import zipfile
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from core import batch
+from core.batch import BATCH_ERROR_REPORT, collect_batch_results, process_batch_zip
+from core.preview import PreviewStore
+from core.work_queue import WorkQueue
+
+
+@pytest.fixture(autouse=True)
+def blank_pages(monkeypatch):
+    monkeypatch.setattr(
+        batch, "pdf_to_images", lambda data, dpi=300: [Image.new("RGB", (1240, 1754), "white")]
+    )
+
+
+def manifest(*names):
+    return [
+        {"student_name": name, "writing_score": "1", "reading_pdf": "r.pdf", "qr_ar_pdf": "q.pdf"}
+        for name in names
+    ]
+
+
+def input_zip():
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        zf.writestr("r.pdf", b"%PDF")
+        zf.writestr("q.pdf", b"%PDF")
+    return buffer.getvalue()
+
+
+def test_preview_failure_only_fails_that_student(monkeypatch):
+    build_preview_entry = batch.build_preview_entry
+
+    def flaky_preview(reading, qr_ar, payload):
+        if payload["student_name"] == "B":
+            raise OSError("encoder crashed")
+        return build_preview_entry(reading, qr_ar, payload)
+
+    monkeypatch.setattr(batch, "build_preview_entry", flaky_preview)
+    previews = PreviewStore()
+    failures = []
+
+    out = process_batch_zip(input_zip(), manifest("A", "B"), {}, {}, previews, failures)
+
+    with zipfile.ZipFile(out) as out_zip:
+        names = out_zip.namelist()
+        report = json.loads(out_zip.read(BATCH_ERROR_REPORT))
+    assert not any(name.startswith("B/") for name in names)
+    assert report["marked"] == 1
+    assert [failure["student_name"] for failure in failures] == ["B"]
+    assert previews.get("A") is not None and previews.get("B") is None
+
+
+def test_unreadable_worker_results_only_fail_that_student(tmp_path):
+    queue = WorkQueue(tmp_path)
+    job_id, _ = queue.create_job_dir()
+    entries = [
+        {"student_name": name, "reading_path": "-", "qr_ar_path": "-", "manifest_entry": entry}
+        for name, entry in zip("AB", manifest("A", "B"))
+    ]
+    queue.enqueue_job(job_id, entries, {}, {})
+
+    for name in "AB":
+        task = queue.claim("worker")
+        result_dir = tmp_path / "results" / job_id / task["id"] / "1"
+        (result_dir / "preview").mkdir(parents=True)
+        (result_dir / f"{name}_marking_data.json").write_text(json.dumps({"student_name": name}))
+        if name == "A":
+            for sheet in ("reading", "qr_ar"):
+                (result_dir / "preview" / f"{sheet}.png").write_bytes(b"png")
+        queue.complete(task["id"], "worker", result_dir)
+
+    previews = PreviewStore()
+    failures = []
+    with zipfile.ZipFile(collect_batch_results(queue, job_id, previews, failures)) as out_zip:
+        names = out_zip.namelist()
+
+    assert "A/A_marking_data.json" in names
+    assert not any(name.startswith("B/") for name in names)
+    assert [failure["student_name"] for failure in failures] == ["B"]
+    assert previews.get("A")["result"] == {"student_name": "A"}
@@ -0,0 +1,90 @@
+import json
+import zipfile
+from io import BytesIO
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from core import batch
+from core.session_store import SESSION_STORE
+from main import app
+from routes import marking
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("ASET_APP_PASSWORD", "pw")
+    monkeypatch.delenv("ASET_QUEUE_DIR", raising=False)
+    monkeypatch.setattr(
+        batch, "pdf_to_images", lambda data, dpi=300: [Image.new("RGB", (1240, 1754), "white")]
+    )
+    client = TestClient(app)
+    session_id = client.post("/auth/login", json={"password": "pw"}).json()["session_id"]
+    client.headers["X-Session-ID"] = session_id
+    client.post("/config/reading-key", json={"1": "A"})
+    return client
+
+
+def post_batch(client, *pdfs, path="/mark/batch", manifest=None):
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for name in pdfs:
+            zf.writestr(name, b"%PDF")
+    data = {"manifest": json.dumps(manifest)} if manifest is not None else {}
+    return client.post(
+        path, data=data, files={"files_zip": ("b.zip", buffer.getvalue(), "application/zip")}
+    )
+
+
+MANIFEST = [
+    {"student_name": "A", "writing_score": "1", "reading_pdf": "r.pdf", "qr_ar_pdf": "q.pdf"},
+    {"student_name": "B", "writing_score": "1", "reading_pdf": "b.pdf", "qr_ar_pdf": "q.pdf"},
+]
+
+
+def batches(client):
+    return SESSION_STORE[client.headers["X-Session-ID"]]["batches"]
+
+
+def test_only_batches_with_failures_are_kept_until_retried(client):
+    clean = post_batch(client, "r.pdf", "q.pdf", manifest=MANIFEST[:1])
+    assert clean.headers["X-Batch-Failed"] == "0"
+    assert batches(client) == {}
+
+    failed = post_batch(client, "r.pdf", "q.pdf", manifest=MANIFEST)
+    batch_id = failed.headers["X-Batch-ID"]
+    assert list(batches(client)) == [batch_id]
+
+    retried = post_batch(client, "b.pdf", "q.pdf", path=f"/mark/batch/{batch_id}/retry")
+    assert retried.headers["X-Batch-Failed"] == "0"
+    assert batches(client) == {}
+
+
+def test_batch_history_is_capped(client, monkeypatch):
+    monkeypatch.setattr(marking, "BATCH_HISTORY_LIMIT", 2)
+    ids = [
+        post_batch(client, "r.pdf", "q.pdf", manifest=MANIFEST).headers["X-Batch-ID"]
+        for _ in range(3)
+    ]
+
+    assert list(batches(client)) == ids[1:]
+    assert client.post(f"/mark/batch/{ids[0]}/retry").status_code == 404
+
+
+def test_preview_evicted_mid_request_is_not_found(client, monkeypatch):
+    previews = SESSION_STORE[client.headers["X-Session-ID"]]["previews"]
+    post_batch(client, "r.pdf", "q.pdf", manifest=MANIFEST[:1])
+    entry = previews.get("A")
+
+    # Another request evicts the entry between our get() and the encode wait.
+    monkeypatch.setattr(previews, "get", lambda name: entry)
+    pending = marking.build_preview_entry.__wrapped__ if False else None
+    for sheet, data in entry["sheets"].items():
+        from concurrent.futures import Future
+
+        cancelled = Future()
+        cancelled.cancel()
+        entry["sheets"][sheet] = cancelled
+
+    assert client.get("/mark/preview/A?sheet=reading").status_code == 404
@@ -0,0 +1,34 @@
+from io import BytesIO
+
+from PIL import Image
+
+from core.preview import PreviewStore, build_preview_entry, render_preview, sheet_bytes
+
+
+def page():
+    return Image.new("RGB", (2480, 3508), "white")
+
+
+def test_entry_encodes_in_background_and_resolves_on_request():
+    entry = build_preview_entry(page(), page(), {"student_name": "A"})
+
+    data = sheet_bytes(entry, "reading")
+    assert data == render_preview(page())
+    # Cached as bytes once resolved
+    assert entry["sheets"]["reading"] is data
+
+    with Image.open(BytesIO(data)) as image:
+        assert image.width <= 900
+
+
+def test_store_evicts_least_recently_used():
+    store = PreviewStore(max_entries=2)
+    for name in ("A", "B"):
+        store.put(name, {"sheets": {}, "result": {"student_name": name}})
+
+    store.get("A")
+    store.put("C", {"sheets": {}, "result": {"student_name": "C"}})
+
+    assert store.get("B") is None
+    assert store.get("A") is not None
+    assert len(store) == 2
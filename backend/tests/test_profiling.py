@@ -0,0 +1,31 @@
+from core.profiling import summarize_profile
+
+
+def stage(name, depth, peak_traced_kb, rss_delta_kb):
+    return {
+        "stage": name,
+        "depth": depth,
+        "seconds": 0.1,
+        "traced_delta_kb": 0,
+        "peak_traced_kb": peak_traced_kb,
+        "rss_delta_kb": rss_delta_kb,
+    }
+
+
+def test_summary_reports_worst_traced_and_rss_per_top_level_stage():
+    profile = {
+        "id": "p1",
+        "peak_rss_kb": 900000,
+        "stages": [
+            stage("pdf.rasterize", 1, 5, 80000),
+            stage("batch.mark_student", 0, 120, 0),
+            stage("batch.mark_student", 0, 90, 35000),
+            stage("preview.render", 0, 4, None),
+        ],
+    }
+
+    assert summarize_profile(profile) == (
+        "id=p1; peak_rss_kb=900000; "
+        "batch.mark_student(traced_kb=120,rss_delta_kb=35000), "
+        "preview.render(traced_kb=4,rss_delta_kb=None)"
+    )
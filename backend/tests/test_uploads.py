@@ -0,0 +1,108 @@
+import asyncio
+import hashlib
+import os
+import time
+
+import pytest
+
+from core.uploads import (
+    UploadBusy,
+    UploadNotFound,
+    UploadOffsetMismatch,
+    create_upload,
+    finalize_upload,
+    get_upload,
+    purge_expired_uploads,
+    write_chunk,
+)
+
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("ASET_UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.mark.parametrize("upload_id", ["../../etc/passwd", "not-a-uuid", ""])
+def test_non_uuid_ids_never_reach_the_filesystem(upload_id):
+    with pytest.raises(UploadNotFound):
+        get_upload(upload_id, "session")
+
+
+def test_expired_uploads_are_purged(upload_dir):
+    old = create_upload("session", "old.zip", 10)["upload_id"]
+    stale = time.time() - 3600
+    for path in upload_dir.glob(f"{old}.*"):
+        os.utime(path, (stale, stale))
+
+    fresh = create_upload("session", "new.zip", 10)["upload_id"]
+
+    assert purge_expired_uploads(max_age=60) == 1
+    with pytest.raises(UploadNotFound):
+        get_upload(old, "session")
+    assert get_upload(fresh, "session")["received"] == 0
+
+
+def test_purge_leaves_unrelated_entries_alone(upload_dir):
+    stale = time.time() - 3600
+    notes = upload_dir / "notes.txt"
+    notes.write_text("keep me")
+    subdir = upload_dir / "12345678-1234-5678-1234-567812345678.part"
+    subdir.mkdir()
+    for path in (notes, subdir):
+        os.utime(path, (stale, stale))
+
+    assert purge_expired_uploads(max_age=60) == 0
+    assert notes.exists() and subdir.is_dir()
+
+
+async def stream(*chunks):
+    for chunk in chunks:
+        await asyncio.sleep(0)
+        yield chunk
+
+
+def put(upload_id, offset, *chunks):
+    return asyncio.run(write_chunk(upload_id, "session", offset, stream(*chunks)))
+
+
+def test_concurrent_writes_to_one_upload_are_rejected():
+    upload_id = create_upload("session", "f.zip", 8)["upload_id"]
+
+    async def both():
+        return await asyncio.gather(
+            write_chunk(upload_id, "session", 0, stream(b"aa", b"aa")),
+            write_chunk(upload_id, "session", 0, stream(b"bb", b"bb")),
+            return_exceptions=True,
+        )
+
+    first, second = asyncio.run(both())
+    assert first == 4
+    assert isinstance(second, UploadBusy)
+    assert get_upload(upload_id, "session")["received"] == 4
+
+
+def test_rewinding_truncates_and_resumes(upload_dir):
+    data = b"0123456789"
+    upload_id = create_upload("session", "f.zip", len(data))["upload_id"]
+
+    assert put(upload_id, 0, b"01234XXX") == 8
+    with pytest.raises(UploadOffsetMismatch):
+        put(upload_id, 9, b"9")
+
+    # Redo the bad tail, then the checksum passes.
+    assert put(upload_id, 5, data[5:]) == len(data)
+    assert finalize_upload(upload_id, "session", hashlib.sha256(data).hexdigest())
+    assert (upload_dir / f"{upload_id}.part").read_bytes() == data
+
+
+def test_upload_can_restart_after_checksum_mismatch():
+    data = b"0123456789"
+    upload_id = create_upload("session", "f.zip", len(data))["upload_id"]
+    put(upload_id, 0, b"garbage!!!")
+
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        finalize_upload(upload_id, "session", hashlib.sha256(data).hexdigest())
+
+    assert put(upload_id, 0, data) == len(data)
+    finalize_upload(upload_id, "session", hashlib.sha256(data).hexdigest())
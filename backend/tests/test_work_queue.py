@@ -0,0 +1,196 @@
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from core import worker
+from core.batch import collect_batch_results, enqueue_batch_zip
+from core.work_queue import WorkQueue
+
+fork = multiprocessing.get_context("fork")
+
+
+def slow_process_task(queue, task):
+    """Stands in for rendering + marking: outlives the lease, writes a result."""
+    time.sleep(2.5)
+    result_dir = queue.queue_dir / "results" / task["job_id"] / task["id"] / str(task["attempts"])
+    result_dir.mkdir(parents=True)
+    (result_dir / f"{task['student_name']}_marking_data.json").write_text("{}")
+    return result_dir
+
+
+def enqueue(queue, count):
+    job_id, input_dir = queue.create_job_dir()
+    entries = []
+    for i in range(count):
+        reading_path = input_dir / f"{i}_reading.pdf"
+        qr_ar_path = input_dir / f"{i}_qr_ar.pdf"
+        reading_path.write_bytes(b"%PDF-reading")
+        qr_ar_path.write_bytes(b"%PDF-qr-ar")
+        entries.append(
+            {
+                "student_name": f"Student {i}",
+                "writing_score": "5",
+                "reading_path": reading_path,
+                "qr_ar_path": qr_ar_path,
+            }
+        )
+    return queue.enqueue_job(job_id, entries, {"reading": {"1": "A"}}, {})
+
+
+def wait_for_job(queue, job_id, timeout):
+    deadline = time.monotonic() + timeout
+    while not queue.job_finished(job_id):
+        assert time.monotonic() < deadline, queue.job_tasks(job_id)
+        time.sleep(0.1)
+
+
+@pytest.fixture
+def local_workers(monkeypatch, tmp_path):
+    """Start N forked worker processes on one queue directory."""
+    monkeypatch.setattr(worker, "process_task", slow_process_task)
+    processes = []
+
+    def start(count, lease_seconds):
+        for i in range(count):
+            queue = WorkQueue(tmp_path, lease_seconds=lease_seconds, max_attempts=2)
+            process = fork.Process(
+                target=worker.run_worker,
+                args=(queue, f"worker-{i}", 0.05),
+                daemon=True,
+            )
+            process.start()
+            processes.append(process)
+
+    yield start
+
+    for process in processes:
+        process.terminate()
+        process.join()
+
+
+def test_slow_tasks_are_not_reclaimed_from_live_workers(local_workers, tmp_path):
+    queue = WorkQueue(tmp_path, lease_seconds=1, max_attempts=2)
+    job_id = enqueue(queue, 3)
+
+    local_workers(3, lease_seconds=1)
+    wait_for_job(queue, job_id, timeout=20)
+
+    tasks = queue.job_tasks(job_id)
+    assert [task["status"] for task in tasks] == ["done"] * 3
+    assert [task["attempts"] for task in tasks] == [1] * 3
+
+
+def test_task_of_dead_worker_is_retried(local_workers, tmp_path):
+    queue = WorkQueue(tmp_path, lease_seconds=1, max_attempts=2)
+    job_id = enqueue(queue, 1)
+    assert queue.claim("worker-that-died")["attempts"] == 1
+
+    local_workers(2, lease_seconds=1)
+    wait_for_job(queue, job_id, timeout=20)
+
+    [task] = queue.job_tasks(job_id)
+    assert task["status"] == "done"
+    assert task["attempts"] == 2
+
+
+def test_late_result_is_accepted_when_nobody_reclaimed(tmp_path):
+    queue = WorkQueue(tmp_path, lease_seconds=0)
+    job_id = enqueue(queue, 1)
+    task = queue.claim("slow-worker")
+    time.sleep(0.05)
+
+    assert queue.complete(task["id"], "slow-worker", tmp_path / "result")
+    assert queue.job_tasks(job_id)[0]["status"] == "done"
+
+
+def test_enqueue_batch_zip_streams_inputs_to_job_dir(tmp_path):
+    archive = tmp_path / "batch.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("a_reading.pdf", b"reading-a")
+        zf.writestr("a_qr_ar.pdf", b"qr-ar-a")
+
+    queue = WorkQueue(tmp_path / "queue")
+    failures = []
+    manifest = [
+        {"student_name": "A", "reading_pdf": "a_reading.pdf", "qr_ar_pdf": "a_qr_ar.pdf"},
+        {"student_name": "B", "reading_pdf": "missing.pdf", "qr_ar_pdf": "a_qr_ar.pdf"},
+    ]
+    job_id = enqueue_batch_zip(queue, archive, manifest, {}, {}, failures=failures)
+
+    [task] = queue.job_tasks(job_id)
+    assert task["student_name"] == "A"
+    assert [failure["student_name"] for failure in failures] == ["B"]
+
+    claimed = queue.claim("worker")
+    with open(claimed["reading_path"], "rb") as fh:
+        assert fh.read() == b"reading-a"
+    assert task["manifest_entry"] == manifest[0]
+
+
+def test_collecting_a_job_deletes_its_rows_and_files(tmp_path):
+    queue = WorkQueue(tmp_path, max_attempts=1)
+    job_id = enqueue(queue, 3)
+    done = queue.claim("worker")
+    queue.complete(done["id"], "worker", slow_process_task(queue, done))
+    failed = queue.claim("worker")
+    queue.fail(failed["id"], "worker", "boom")
+    straggler = queue.claim("slow-worker")
+
+    failures = []
+    with zipfile.ZipFile(collect_batch_results(queue, job_id, failures=failures)) as out_zip:
+        assert "Student 0/Student 0_marking_data.json" in out_zip.namelist()
+    assert [failure["error"] for failure in failures] == ["boom", None]
+
+    assert queue.job_tasks(job_id) == []
+    assert not (tmp_path / "inputs" / job_id).exists()
+    assert not (tmp_path / "results" / job_id).exists()
+    # A worker still holding a lease on the dropped job cannot complete it.
+    assert not queue.complete(straggler["id"], "slow-worker", tmp_path / "late")
+
+
+def child_pids(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as fh:
+        return [int(child) for child in fh.read().split()]
+
+
+def is_running(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as fh:
+            return fh.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+@pytest.mark.skipif(
+    not os.path.exists(f"/proc/{os.getpid()}/task/{os.getpid()}/children"),
+    reason="needs /proc child lists",
+)
+def test_supervisor_stops_its_workers_on_sigterm(tmp_path):
+    supervisor = subprocess.Popen(
+        [sys.executable, "-m", "core.worker", "--queue-dir", str(tmp_path), "--processes", "2"],
+        cwd=Path(__file__).resolve().parents[1],
+    )
+    workers = []
+    try:
+        deadline = time.monotonic() + 20
+        while len(workers) < 2:
+            assert time.monotonic() < deadline
+            time.sleep(0.1)
+            workers = child_pids(supervisor.pid)
+        time.sleep(0.5)  # let the supervisor install its handlers
+
+        supervisor.send_signal(signal.SIGTERM)
+        assert supervisor.wait(timeout=20) == 128 + signal.SIGTERM
+        assert not any(is_running(pid) for pid in workers)
+    finally:
+        supervisor.kill()
+        for pid in workers:
+            if is_running(pid):
+                os.kill(pid, signal.SIGKILL)